@@ -2,28 +2,31 @@ from __future__ import annotations
 
 import os
 import base64
+import hashlib
+import json
+import math
 from functools import wraps
-import re
 
 from pathlib import Path
 import sys
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from flask_cors import CORS 
 
-from sheets_repo import SheetsRepo
-
 from dotenv import load_dotenv
 
-import time
-from datetime import datetime, date
-from zoneinfo import ZoneInfo
+# до импорта наших модулей: они читают настройки из окружения при импорте
+load_dotenv()
+
+from sheets_repo import SheetsRepo
+from sheets_quota import QuotaExceeded
+from reading_stats import TZ, ReadingStats
+from library_store import books_to_json, progress_to_json
+from rec_jobs import FINISHED, RecJobs, RecJobsBusy
 
 import traceback
 
 from ai_profile import build_profile_text
-from yandex_gpt_client import generate_book_recommendations
-
-load_dotenv()
+from yandex_gpt_client import generate_book_recommendations, stream_book_recommendations
 
 SHEET_ID = os.environ.get("SPREADSHEET_ID") or os.environ.get("SHEET_ID") or "1EbxX-duNfkOw6EWHMYmrTurKLbL0gdOlhYY5eC2YEKQ"
 
@@ -35,11 +38,25 @@ CORS(
         "http://localhost:8000"
     ]}}
 )
-repo = SheetsRepo(sheet_id=SHEET_ID)
-
-SYNC_CACHE = {"ts": 0.0, "data": None}
 SYNC_TTL = int(os.getenv("SYNC_TTL", "10"))  # 10 секунд по умолчанию
 
+# repo.snapshot() is the shared cache for every read endpoint (see SheetsRepo.snapshot)
+repo = SheetsRepo(sheet_id=SHEET_ID, snapshot_ttl=SYNC_TTL)
+stats = ReadingStats(repo, tz=TZ)
+
+# AI-рекомендации генерируются фоновыми задачами (см. rec_jobs.RecJobs)
+rec_jobs = RecJobs(
+    max_concurrent=int(os.getenv("AI_RECS_MAX_CONCURRENT", "2")),
+    max_pending=int(os.getenv("AI_RECS_MAX_PENDING", "20")),
+    keep_seconds=float(os.getenv("AI_RECS_JOB_TTL", "600")),
+)
+# потоковая генерация: каждая рекомендация отдаётся клиенту, как только готова
+AI_RECS_STREAM = os.getenv("AI_RECS_STREAM", "1") == "1"
+# после каждой показанной подборки заранее готовить следующую (для force=1)
+AI_RECS_PREFETCH = os.getenv("AI_RECS_PREFETCH", "0") == "1"
+# параметры генерации входят в ключ кэша подборок
+AI_RECS_PARAMS = {"temperature": 0.4, "max_tokens": 1200}
+
 APP_LOGIN = os.getenv("AUTH_LOGIN", "")
 APP_PASSWORD = os.getenv("AUTH_PASSWORD", "")
 
@@ -83,167 +100,6 @@ def require_basic_auth(fn):
 
     return wrapper
 
-TZ = ZoneInfo(os.getenv("APP_TZ", "Europe/Moscow"))
-
-def _parse_dt(s: str):
-    if not s:
-        return None
-    t = str(s).strip()
-    if not t:
-        return None
-
-    # ✅ "+0300" -> "+03:00"
-    t = re.sub(r"([+-]\d{2})(\d{2})$", r"\1:\2", t)
-
-    # 1) "YYYY-MM-DD HH:mm"
-    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d"):
-        try:
-            return datetime.strptime(t, fmt)
-        except ValueError:
-            pass
-
-    # 2) "DD.MM.YYYY HH:mm" / "DD.MM.YYYY"
-    for fmt in ("%d.%m.%Y %H:%M", "%d.%m.%Y"):
-        try:
-            return datetime.strptime(t, fmt)
-        except ValueError:
-            pass
-
-    # 3) ISO (или "YYYY-MM-DDTHH:mm:ss", или "YYYY-MM-DD HH:mm:ss")
-    try:
-        iso = t.replace(" ", "T")
-        return datetime.fromisoformat(iso)
-    except Exception:
-        return None
-
-def compute_streak(progress_rows):
-    days = set()
-    for p in (progress_rows or []):
-        dt = _parse_dt(p.get("endAt")) or _parse_dt(p.get("startAt"))
-        if not dt:
-            continue
-        days.add(dt.date())
-
-    today = datetime.now(TZ).date()
-
-    if not days:
-        return {
-            "streak": 0,
-            "icon": "candle",   # candle|fire
-            "today_has_reading": False,
-            "last_day": None,
-            "today": today.isoformat(),
-        }
-
-    last_day = max(days)
-    gap = (today - last_day).days
-
-    # 3) пропущен день (последняя запись позавчера или раньше) -> сгорел
-    if gap >= 2:
-        return {
-            "streak": 0,
-            "icon": "candle",
-            "today_has_reading": False,
-            "last_day": last_day.isoformat(),
-            "today": today.isoformat(),
-        }
-
-    # посчитаем длину "цепочки" на момент last_day
-    cur = last_day
-    streak = 0
-    while cur in days:
-        streak += 1
-        cur = date.fromordinal(cur.toordinal() - 1)
-
-    # 1) сегодня есть чтение -> огонёк
-    if gap == 0:
-        return {
-            "streak": streak,
-            "icon": "fire",
-            "today_has_reading": True,
-            "last_day": last_day.isoformat(),
-            "today": today.isoformat(),
-        }
-
-    # 2) сегодня нет чтения, но вчера было:
-    # показываем свечку и N только если стрик > 1, иначе (по твоему условию) -> 0
-    if gap == 1:
-        return {
-            "streak": streak if streak > 1 else 0,
-            "icon": "candle",
-            "today_has_reading": False,
-            "last_day": last_day.isoformat(),
-            "today": today.isoformat(),
-        }
-
-def _xp_for_pages(pages: int) -> int:
-    # если pages не заполнено — даём "среднюю" награду
-    if not pages or pages <= 0:
-        return 180
-    if pages <= 300:
-        return 100
-    if pages <= 500:
-        return 180
-    if pages <= 800:
-        return 300
-    return 450
-
-def _norm_status(s: str) -> str:
-    v = (s or "").strip().lower()
-    if v in ("прочитано", "completed", "complited"):
-        return "completed"
-    if v in ("читаю", "reading"):
-        return "reading"
-    if v in ("хочу прочитать", "запланировано", "planned"):
-        return "planned"
-    return "planned"
-
-def compute_xp(books_rows, progress_rows):
-    """
-    XP = XP за прочитанные книги (по объёму) + XP за дни чтения (10 XP за день)
-    - книга прочитана, если status == 'completed'
-    - день чтения: есть хотя бы одна запись прогресса в этот день (берём endAt, если пусто — startAt)
-    """
-    # 1) XP за книги
-    xp_books = 0
-    for b in (books_rows or []):
-        if _norm_status(b.get("status")) == "completed":
-            pages = int(b.get("pages") or 0)
-            xp_books += _xp_for_pages(pages)
-
-    # 2) XP за дни
-    days = set()
-    for p in (progress_rows or []):
-        dt = _parse_dt(p.get("endAt")) or _parse_dt(p.get("startAt"))
-        if not dt:
-            continue
-        days.add(dt.date())
-
-    xp_days = 10 * len(days)
-    xp_total = xp_books + xp_days
-
-    return {
-        "xp_total": xp_total,
-        "xp_books": xp_books,
-        "xp_days": xp_days,
-        "days_count": len(days),
-        "today": datetime.now(TZ).date().isoformat(),
-    }
-
-def _longest_streak(days_set: set[date]) -> int:
-    if not days_set:
-        return 0
-    days = sorted(days_set)
-    best = 1
-    cur = 1
-    for i in range(1, len(days)):
-        if (days[i] - days[i - 1]).days == 1:
-            cur += 1
-            best = max(best, cur)
-        else:
-            cur = 1
-    return best
-
 @app.get("/health")
 def health():
     return jsonify({"ok": True})
@@ -276,29 +132,51 @@ def protect_api():
 
 @app.get("/api/sync")
 def api_sync():
-    now = time.time()
-    if SYNC_CACHE["data"] is not None and (now - SYNC_CACHE["ts"]) < SYNC_TTL:
-        return jsonify(SYNC_CACHE["data"])
-
-    books, progress = repo.read_all()
-    data = {"books": books, "progress": progress}
-
-    SYNC_CACHE["ts"] = now
-    SYNC_CACHE["data"] = data
-    return jsonify(data)
+    books, progress, version = repo.versioned_snapshot()
+
+    # ?since=<version>: только изменения после этой версии (если журнал их ещё помнит)
+    since = request.args.get("since")
+    if since:
+        delta = repo.changes_since(since)
+        if delta is not None:
+            resp = jsonify({
+                "version": delta["version"],
+                "full": False,
+                "books": books_to_json(delta["books"]),
+                "deleted": delta["deleted"],
+                "progress": progress_to_json(delta["progress"]),
+            })
+        else:
+            resp = jsonify({
+                "books": books_to_json(books),
+                "progress": progress_to_json(progress),
+                "version": version,
+                "full": True,
+            })
+        resp.headers["Cache-Control"] = "private, no-store"
+        return resp
+
+    # клиент уже видел эту версию — тело не собираем вовсе
+    if request.if_none_match.contains(version):
+        resp = Response(status=304)
+    else:
+        resp = jsonify({"books": books_to_json(books), "progress": progress_to_json(progress), "version": version})
+    resp.set_etag(version)
+    # private: ответ зависит от авторизации; no-cache: всегда перепроверять по ETag
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
 
 @app.get("/api/xp")
 def api_xp():
-    books, progress = repo.read_all()
-    return jsonify(compute_xp(books, progress))
+    return jsonify(stats.xp())
 
 @app.post("/api/books/upsert")
 def api_books_upsert():
     book = request.get_json(force=True) or {}
     repo.upsert_book(book)
-    books, progress = repo.read_all()
-    ai = repo.read_ai_recs_last()
-    return jsonify({"books": books, "progress": progress, "ai": ai})
+    books, progress = repo.snapshot()
+    ai = repo.read_ai_recs_last(use_cache=True)
+    return jsonify({"books": books_to_json(books), "progress": progress_to_json(progress), "ai": ai})
 
 
 @app.post("/api/books/delete")
@@ -307,21 +185,48 @@ def api_books_delete():
     title = payload.get("title", "")
     author = payload.get("author", "")
     repo.delete_book(title=title, author=author)
-    books, progress = repo.read_all()
-    return jsonify({"books": books, "progress": progress})
+    books, progress = repo.snapshot()
+    return jsonify({"books": books_to_json(books), "progress": progress_to_json(progress)})
 
 
 @app.post("/api/progress/append")
 def api_progress_append():
     item = request.get_json(force=True) or {}
     repo.append_progress(item)
-    books, progress = repo.read_all()
-    return jsonify({"books": books, "progress": progress})
+    books, progress = repo.snapshot()
+    return jsonify({"books": books_to_json(books), "progress": progress_to_json(progress)})
 
-@app.post("/api/recs/ai")
-def api_recs_ai():
+def _payload_list(payload, key: str):
+    # accepts a bare JSON array or {"<key>": [...]}
+    items = payload.get(key) if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not all(isinstance(x, dict) for x in items):
+        return None
+    return items
+
+
+@app.post("/api/books/bulk_upsert")
+def api_books_bulk_upsert():
+    books = _payload_list(request.get_json(force=True), "books")
+    if books is None:
+        return jsonify({"error": "expected a list of books"}), 400
+    repo.upsert_books(books)
+    books, progress = repo.snapshot()
+    return jsonify({"books": books_to_json(books), "progress": progress_to_json(progress)})
+
+
+@app.post("/api/progress/bulk_append")
+def api_progress_bulk_append():
+    items = _payload_list(request.get_json(force=True), "progress")
+    if items is None:
+        return jsonify({"error": "expected a list of progress items"}), 400
+    repo.append_progress_many(items)
+    books, progress = repo.snapshot()
+    return jsonify({"books": books_to_json(books), "progress": progress_to_json(progress)})
+
+def _rec_profile():
     # 1. Читаем все книги пользователя
-    books, _ = repo.read_all()
+    books, _ = repo.snapshot()
+    books = books_to_json(books)
 
     # 2. Собираем "уже есть у пользователя" (прочитано / добавлено)
     owned = {
@@ -338,26 +243,154 @@ def api_recs_ai():
 
     # 5. Строим профиль с учётом запрещённых книг
     profile = build_profile_text(books, excluded)
+    return profile, excluded
 
-    # 6. Получаем рекомендации от GPT
-    recs = generate_book_recommendations(profile_text=profile)
+def _rec_fingerprint(profile: str) -> str:
+    raw = json.dumps({"profile": profile, **AI_RECS_PARAMS}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
 
+def _llm_recs(profile: str, excluded: set, emit=None):
+    # 6. Получаем рекомендации от GPT
     # 7. Железный пост-фильтр (на всякий случай)
-    recs = [
+    if AI_RECS_STREAM and emit is not None:
+        recs = []
+        for r in stream_book_recommendations(profile_text=profile, **AI_RECS_PARAMS):
+            if f"{r['title'].lower()}|{r['author'].lower()}" in excluded:
+                continue
+            recs.append(r)
+            emit(r)
+        return recs
+
+    recs = generate_book_recommendations(profile_text=profile, **AI_RECS_PARAMS)
+    return [
         r for r in recs
         if f"{r['title'].lower()}|{r['author'].lower()}" not in excluded
     ]
 
+def _publish_recs(recs):
     # 8. Сохраняем результат в Google Sheet
-    repo.append_ai_recs(recs)
+    created_at = repo.append_ai_recs(recs)
+
+    # 9. Кэшируем под профилем, каким он стал после записи (подборка уже
+    # в исключениях): повторный запрос без изменений получит её же
+    profile, excluded = _rec_profile()
+    key = _rec_fingerprint(profile)
+    repo.rec_cache.put(key, recs, created_at)
+    if AI_RECS_PREFETCH:
+        try:
+            rec_jobs.submit("next:" + key, lambda emit: _prefetch_recs(key, profile, excluded))
+        except RecJobsBusy:
+            pass
+    return created_at
+
+def _prefetch_recs(key: str, profile: str, excluded: set):
+    recs = _llm_recs(profile, excluded)
+    repo.rec_cache.put_next(key, recs)
+    return recs
 
-    return jsonify({"recs": recs})
+def _generate_recs(profile: str, excluded: set, emit):
+    recs = _llm_recs(profile, excluded, emit)
+    _publish_recs(recs)
+    return recs
+
+def _done_recs(recs, created_at):
+    # готовая подборка в том же виде, что и завершённая задача
+    return jsonify({"status": "done", "cached": True, "created_at": created_at, "finished_at": created_at, "recs": recs})
+
+@app.post("/api/recs/ai")
+def api_recs_ai():
+    # профиль собирается из памяти быстро; сам запрос к GPT уходит в фоновую задачу.
+    # Если профиль не менялся — сразу отдаём ту же подборку из кэша;
+    # force=1 (в query или {"force": true} в теле) просит новую
+    body = request.get_json(silent=True)
+    force = request.args.get("force") in ("1", "true") or (isinstance(body, dict) and body.get("force") is True)
+
+    profile, excluded = _rec_profile()
+    key = _rec_fingerprint(profile)
+    if not force:
+        cached = repo.rec_cache.get(key)
+        if cached is not None:
+            return _done_recs(cached["recs"], cached["created_at"])
+    else:
+        # заранее подготовленная следующая подборка для этого же профиля
+        recs = repo.rec_cache.take_next(key)
+        if recs is not None:
+            return _done_recs(recs, _publish_recs(recs))
+
+    job, _ = rec_jobs.submit(key, lambda emit: _generate_recs(profile, excluded, emit))
+
+    resp = jsonify(job)
+    resp.status_code = 202
+    resp.headers["Location"] = f"/api/recs/ai/jobs/{job['id']}"
+    return resp
+
+@app.get("/api/recs/ai/jobs/<job_id>")
+def api_recs_ai_job(job_id):
+    job = rec_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job)
+
+@app.get("/api/recs/ai/jobs/<job_id>/events")
+def api_recs_ai_job_events(job_id):
+    # Server-Sent Events: "rec" — каждая новая рекомендация, как только готова,
+    # "status" — каждое изменение статуса задачи
+    if rec_jobs.get(job_id) is None:
+        return jsonify({"error": "job not found"}), 404
+
+    def event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def stream():
+        status, sent = None, 0
+        while True:
+            job = rec_jobs.wait(job_id, status, sent, timeout=15)
+            if job is None:
+                return
+            items = job.get("recs") or job.get("partial") or []
+            if job["status"] == status and len(items) <= sent:
+                yield ": keep-alive\n\n"
+                continue
+            for item in items[sent:]:
+                yield event("rec", item)
+            sent = max(sent, len(items))
+            if job["status"] != status:
+                status = job["status"]
+                yield event("status", job)
+            if status in FINISHED:
+                return
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/api/recs/ai")
 def api_recs_ai_get():
     last = repo.read_ai_recs_last()
     return jsonify(last or {"created_at": None, "recs": []})
 
+@app.get("/api/stats/sheets")
+def api_stats_sheets():
+    # счётчики квоты Sheets API: сколько вызовов ждали, повторялись, были отклонены
+    return jsonify(repo.quota.stats())
+
+@app.errorhandler(QuotaExceeded)
+def handle_quota_exceeded(e):
+    # не 500: квота восстановится, клиенту достаточно повторить запрос позже
+    resp = jsonify({"error": str(e)})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = str(max(1, math.ceil(e.retry_after)))
+    return resp
+
+@app.errorhandler(RecJobsBusy)
+def handle_rec_jobs_busy(e):
+    resp = jsonify({"error": str(e)})
+    resp.status_code = 503
+    resp.headers["Retry-After"] = "30"
+    return resp
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     print("EXCEPTION:", repr(e))
@@ -366,8 +399,7 @@ def handle_exception(e):
 
 @app.get("/api/streak")
 def api_streak():
-    _, progress = repo.read_all()
-    return jsonify(compute_streak(progress))
+    return jsonify(stats.streak())
 
 if __name__ == "__main__":
     import os
@@ -0,0 +1,76 @@
+# backend/bench/bench_parse_dt.py
+"""
+Micro-benchmark for reading_stats._parse_dt.
+
+    python bench/bench_parse_dt.py [rows]
+
+Compares the old try-every-format parser with the shape-detecting one,
+cold (empty cache) and warm (every string seen before).
+"""
+from __future__ import annotations
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reading_stats import _parse_dt, _parse_dt_cached, _parse_dt_slow  # noqa: E402
+
+
+def _sample(n: int, seed: int = 42) -> list[str]:
+    """Timestamps shaped like the ones found in the "Прогресс" sheet."""
+    rnd = random.Random(seed)
+    start = datetime(2022, 1, 1)
+    formats = [
+        ("%Y-%m-%d %H:%M", 0.55),      # what the frontend writes
+        ("%d.%m.%Y", 0.15),            # typed by hand in the sheet
+        ("%d.%m.%Y %H:%M", 0.10),
+        ("%Y-%m-%dT%H:%M:%S+0300", 0.15),
+        ("%Y-%m-%d", 0.05),
+    ]
+    out = []
+    for _ in range(n):
+        ts = start + timedelta(minutes=rnd.randint(0, 3 * 365 * 24 * 60))
+        r = rnd.random()
+        for fmt, weight in formats:
+            r -= weight
+            if r <= 0:
+                break
+        out.append(ts.strftime(fmt))
+    return out
+
+
+def _slow(s):
+    t = str(s).strip() if s else ""
+    return _parse_dt_slow(t) if t else None
+
+
+def _run(fn, values) -> float:
+    t0 = time.perf_counter()
+    for v in values:
+        fn(v)
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    values = _sample(n)
+
+    rounds = 3  # best of
+
+    slow = min(_run(_slow, values) for _ in range(rounds))
+    _parse_dt_cached.cache_clear()
+    cold = _run(_parse_dt, values)
+    warm = min(_run(_parse_dt, values) for _ in range(rounds))
+
+    print(f"{n} timestamps")
+    print(f"{'parser':<22}{'total ms':>10}{'us/call':>10}{'speedup':>10}")
+    for name, t in (("strptime chain", slow), ("shape-detect (cold)", cold), ("shape-detect (warm)", warm)):
+        print(f"{name:<22}{t * 1000:>10.1f}{t / n * 1e6:>10.2f}{slow / t:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# backend/bench/bench_recs_stream.py
+"""
+Time to the first and to all AI recommendations, streamed vs one request.
+
+    python bench/bench_recs_stream.py [--chunk 12] [--delay 0.05]
+
+Runs yandex_gpt_client against bench/fake_yandex_gpt.py, also with a
+truncated stream that has to be completed by the repair pass.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable, Iterable, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+os.environ.setdefault("YC_API_KEY", "bench")
+os.environ.setdefault("YC_FOLDER_ID", "bench")
+
+import yandex_gpt_client  # noqa: E402
+from fake_yandex_gpt import FakeYandexGPT  # noqa: E402
+from yandex_gpt_client import generate_book_recommendations, stream_book_recommendations  # noqa: E402
+
+
+def measure(run: Callable[[], Iterable[dict]]) -> Tuple[float, float, List[str]]:
+    """(ms to first item, ms to last item, titles)."""
+    t0 = time.perf_counter()
+    first, titles = None, []
+    for rec in run():
+        if first is None:
+            first = time.perf_counter() - t0
+        titles.append(rec["title"])
+    total = time.perf_counter() - t0
+    return (first or total) * 1000, total * 1000, titles
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunk", type=int, default=12, help="characters per streamed line")
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds between streamed lines")
+    args = parser.parse_args()
+
+    print(f"{'case':<22}{'first ms':>10}{'all ms':>10}{'recs':>6}{'calls':>7}")
+    for name, truncated, stream in [
+        ("one request", False, False),
+        ("stream", False, True),
+        ("stream, truncated", True, True),
+    ]:
+        server = FakeYandexGPT(chunk=args.chunk, delay=args.delay, truncated=truncated).start()
+        yandex_gpt_client.YANDEX_COMPLETION_URL = server.url
+        try:
+            if stream:
+                first, total, titles = measure(lambda: stream_book_recommendations(profile_text="bench"))
+            else:
+                first, total, titles = measure(lambda: generate_book_recommendations(profile_text="bench"))
+        finally:
+            server.stop()
+        if titles != [r["title"] for r in server.recs]:
+            raise RuntimeError(f"{name}: unexpected recommendations {titles}")
+        print(f"{name:<22}{first:>10.0f}{total:>10.0f}{len(titles):>6}{len(server.requests):>7}")
+
+
+if __name__ == "__main__":
+    main()
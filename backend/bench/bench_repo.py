@@ -0,0 +1,154 @@
+# backend/bench/bench_repo.py
+"""
+Benchmark of SheetsRepo and the Flask endpoints against an in-memory spreadsheet.
+
+    python bench/bench_repo.py [--sizes 100,1000,10000] [--latency 0.05] [--rounds 20]
+
+`--latency` is the simulated round trip of one Sheets API call in seconds
+(0 measures only our own CPU time). For every library size it prints the
+median and p95 latency per operation and how many Sheets calls it made.
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import os
+import statistics
+import sys
+import time
+import warnings
+from typing import Callable, Dict, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+os.environ.setdefault("AUTH_LOGIN", "bench")
+os.environ.setdefault("AUTH_PASSWORD", "bench")
+
+import sheets_repo  # noqa: E402
+from fake_gspread import FakeClient  # noqa: E402
+from sheets_repo import AI_RECS_HEADERS, AI_RECS_SHEET, BOOKS_HEADERS, BOOKS_SHEET_NAME  # noqa: E402
+from sheets_repo import PROGRESS_HEADERS, PROGRESS_SHEET_NAME, SheetsRepo  # noqa: E402
+
+# ws.update("A1", [...]) in the old argument order
+warnings.simplefilter("ignore", DeprecationWarning)
+
+PROGRESS_PER_BOOK = 3
+
+
+def make_sheets(n_books: int) -> Dict[str, List[List[str]]]:
+    statuses = ["прочитано", "читаю", "хочу прочитать"]
+    books = [BOOKS_HEADERS] + [
+        [f"Book {i}", f"Author {i % 97}", statuses[i % 3], "Жанр", str(150 + i % 400), str(i % 10),
+         "", str(1950 + i % 70), "", "8", "7", "6", "", "9", "", "", "5", "", ""]
+        for i in range(n_books)
+    ]
+    progress = [PROGRESS_HEADERS] + [
+        [f"Book {i % n_books}", str(10 * (i // n_books)), str(10 * (i // n_books + 1)),
+         f"2024-{1 + i % 12:02d}-{1 + i % 28:02d} 10:00", f"2024-{1 + i % 12:02d}-{1 + i % 28:02d} 11:00"]
+        for i in range(n_books * PROGRESS_PER_BOOK)
+    ]
+    ai = [AI_RECS_HEADERS] + [
+        [f"2024-01-{1 + i % 28:02d}T10:00:00+00:00", '[{"title": "Rec %d", "author": "A"}]' % i]
+        for i in range(50)
+    ]
+    return {BOOKS_SHEET_NAME: books, PROGRESS_SHEET_NAME: progress, AI_RECS_SHEET: ai}
+
+
+def measure(client: FakeClient, rounds: int, op: Callable[[int], object]) -> Tuple[float, float, float]:
+    """(median ms, p95 ms, Sheets calls per op)."""
+    times = []
+    before = sum(client.calls.values())
+    for i in range(rounds):
+        t0 = time.perf_counter()
+        op(i)
+        times.append((time.perf_counter() - t0) * 1000)
+    calls = (sum(client.calls.values()) - before) / rounds
+    times.sort()
+    return statistics.median(times), times[min(len(times) - 1, int(len(times) * 0.95))], calls
+
+
+def bench_repo(n_books: int, latency: float, rounds: int) -> List[Tuple[str, float, float, float]]:
+    client = FakeClient(make_sheets(n_books), latency=latency)
+    repo = SheetsRepo(sheet_id="bench", client=client, write_queue=False, snapshot_path="", refresher=False)
+
+    rows = []
+    cold = measure(client, 1, lambda i: repo.read_all())
+    rows.append(("read_all (cold)",) + cold)
+    rows.append(("read_all",) + measure(client, rounds, lambda i: repo.read_all()))
+    rows.append(("snapshot",) + measure(client, rounds, lambda i: repo.snapshot()))
+    rows.append(("upsert_book (existing)",) + measure(
+        client, rounds, lambda i: repo.upsert_book({"title": f"Book {i}", "author": f"Author {i % 97}", "rating": 7})
+    ))
+    rows.append(("upsert_book (new)",) + measure(
+        client, rounds, lambda i: repo.upsert_book({"title": f"New {i}", "author": "Bench"})
+    ))
+    rows.append(("delete_book",) + measure(
+        client, rounds, lambda i: repo.delete_book(f"New {i}", "Bench")
+    ))
+    rows.append(("append_progress",) + measure(
+        client, rounds, lambda i: repo.append_progress({"book": "Book 1", "startPage": i, "endPage": i + 5})
+    ))
+    return rows
+
+
+def bench_api(n_books: int, latency: float, rounds: int) -> List[Tuple[str, float, float, float]]:
+    # app.py builds its repo at import time; the bench swaps it for one on the fake spreadsheet
+    real_credentials = sheets_repo.get_credentials
+    sheets_repo.get_credentials = lambda scopes=None: None
+    try:
+        import app as app_module
+    finally:
+        sheets_repo.get_credentials = real_credentials
+    from reading_stats import TZ, ReadingStats
+
+    client = FakeClient(make_sheets(n_books), latency=latency)
+    app_module.repo = SheetsRepo(sheet_id="bench", client=client, write_queue=False, snapshot_path="", refresher=False)
+    app_module.stats = ReadingStats(app_module.repo, tz=TZ)
+    app_module.repo.read_all()
+
+    http = app_module.app.test_client()
+    token = base64.b64encode(f"{os.environ['AUTH_LOGIN']}:{os.environ['AUTH_PASSWORD']}".encode()).decode()
+    auth = {"Authorization": f"Basic {token}"}
+    etag = http.get("/api/sync", headers=auth).headers["ETag"]
+
+    def check(resp) -> None:
+        if resp.status_code >= 400:
+            raise RuntimeError(f"{resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+
+    rows = []
+    rows.append(("GET /api/sync",) + measure(client, rounds, lambda i: check(http.get("/api/sync", headers=auth))))
+    rows.append(("GET /api/sync (304)",) + measure(
+        client, rounds, lambda i: check(http.get("/api/sync", headers={**auth, "If-None-Match": etag}))
+    ))
+    rows.append(("GET /api/streak",) + measure(client, rounds, lambda i: check(http.get("/api/streak", headers=auth))))
+    rows.append(("GET /api/xp",) + measure(client, rounds, lambda i: check(http.get("/api/xp", headers=auth))))
+    rows.append(("POST /api/books/upsert",) + measure(client, rounds, lambda i: check(http.post(
+        "/api/books/upsert", json={"title": f"Api {i}", "author": "Bench"}, headers=auth
+    ))))
+    rows.append(("POST /api/books/delete",) + measure(client, rounds, lambda i: check(http.post(
+        "/api/books/delete", json={"title": f"Api {i}", "author": "Bench"}, headers=auth
+    ))))
+    rows.append(("POST /api/progress/append",) + measure(client, rounds, lambda i: check(http.post(
+        "/api/progress/append", json={"book": "Book 2", "startPage": i, "endPage": i + 3}, headers=auth
+    ))))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000", help="library sizes (books), comma separated")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per Sheets API call")
+    parser.add_argument("--rounds", type=int, default=20, help="repetitions per operation")
+    args = parser.parse_args()
+
+    for n in (int(x) for x in args.sizes.split(",")):
+        print(f"\n{n} books, {n * PROGRESS_PER_BOOK} progress rows, {args.latency * 1000:.0f} ms per API call")
+        print(f"{'operation':<28}{'median ms':>11}{'p95 ms':>10}{'API calls':>11}")
+        for name, median, p95, calls in bench_repo(n, args.latency, args.rounds) + bench_api(n, args.latency, args.rounds):
+            print(f"{name:<28}{median:>11.2f}{p95:>10.2f}{calls:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# backend/bench/fake_gspread.py
+"""
+In-memory stand-in for the part of gspread that SheetsRepo uses.
+
+    client = FakeClient({"Все книги": [[...header...], [...row...]], ...}, latency=0.05)
+    repo = SheetsRepo(sheet_id="bench", client=client)
+
+Every API call sleeps `latency` seconds (a float, or {method name: seconds}
+with a "default" key) and is counted in client.calls, so benchmarks can
+report both time and Sheets requests per operation. Cells are stored as
+strings, the way the Sheets API returns them.
+"""
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Union
+
+import gspread
+
+Latency = Union[float, Dict[str, float]]
+
+_A1_RE = re.compile(r"^([A-Z]*)(\d*)$")
+
+
+def _col_number(letters: str) -> int:
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+
+def _col_letters(n: int) -> str:
+    s = ""
+    while n:
+        n, r = divmod(n - 1, 26)
+        s = chr(65 + r) + s
+    return s
+
+
+def _split_range(rng: str):
+    """'Sheet'!A2:C10 -> (title or None, first row, first col, last row or None, last col or None)."""
+    title = None
+    if "!" in rng:
+        title, rng = rng.rsplit("!", 1)
+        title = title.strip("'")
+    elif rng.startswith("'") and rng.endswith("'"):
+        # a bare sheet name means the whole sheet
+        return rng.strip("'"), 1, 1, None, None
+    a, _, b = rng.partition(":")
+    c1, r1 = _A1_RE.match(a).groups()
+    c2, r2 = _A1_RE.match(b).groups() if b else (c1, r1)
+    return (
+        title,
+        int(r1) if r1 else 1,
+        _col_number(c1) if c1 else 1,
+        int(r2) if r2 else None,
+        _col_number(c2) if c2 else None,
+    )
+
+
+def _cell(v: Any) -> str:
+    return "" if v is None else str(v)
+
+
+def _trim(rows: List[List[str]]) -> List[List[str]]:
+    # the API drops trailing empty cells and rows
+    out = []
+    for r in rows:
+        r = list(r)
+        while r and r[-1] == "":
+            r.pop()
+        out.append(r)
+    while out and not out[-1]:
+        out.pop()
+    return out
+
+
+class FakeWorksheet:
+    def __init__(self, client: "FakeClient", title: str, rows: Optional[List[List[Any]]] = None):
+        self.client = client
+        self.title = title
+        self.data: List[List[str]] = [[_cell(v) for v in r] for r in (rows or [])]
+        self.col_count = max([len(r) for r in self.data] + [26])
+
+    def _slice(self, rng: str) -> List[List[str]]:
+        _, r1, c1, r2, c2 = _split_range(rng)
+        r2 = r2 or len(self.data)
+        c2 = c2 or self.col_count
+        rows = [self.data[i] if i < len(self.data) else [] for i in range(r1 - 1, r2)]
+        return _trim([[row[j] if j < len(row) else "" for j in range(c1 - 1, c2)] for row in rows])
+
+    def _write(self, rng: str, values: List[List[Any]]) -> None:
+        _, r1, c1, _, _ = _split_range(rng)
+        for i, row in enumerate(values):
+            while len(self.data) < r1 + i:
+                self.data.append([])
+            target = self.data[r1 - 1 + i]
+            for j, v in enumerate(row):
+                while len(target) < c1 + j:
+                    target.append("")
+                target[c1 - 1 + j] = _cell(v)
+
+    def row_values(self, row: int, **kwargs) -> List[str]:
+        with self.client._call("row_values"):
+            rows = _trim([self.data[row - 1]]) if row <= len(self.data) else []
+            return rows[0] if rows else []
+
+    def get_all_values(self, **kwargs) -> List[List[str]]:
+        with self.client._call("get_all_values"):
+            rows = _trim(self.data)
+            width = max([len(r) for r in rows] + [0])
+            return [r + [""] * (width - len(r)) for r in rows]
+
+    def get_values(self, range_name: Optional[str] = None, **kwargs) -> List[List[str]]:
+        with self.client._call("get_values"):
+            return self._slice(range_name) if range_name else _trim(self.data)
+
+    def batch_get(self, ranges: List[str], **kwargs) -> List[List[List[str]]]:
+        with self.client._call("batch_get"):
+            return [self._slice(rng) for rng in ranges]
+
+    def get_all_records(self, **kwargs) -> List[Dict[str, Any]]:
+        with self.client._call("get_all_records"):
+            rows = _trim(self.data)
+            if not rows:
+                return []
+            width = max(len(r) for r in rows)
+            rows = [r + [""] * (width - len(r)) for r in rows]
+            return [
+                {k: gspread.utils.numericise(v, default_blank="") for k, v in zip(rows[0], r)}
+                for r in rows[1:]
+            ]
+
+    def resize(self, rows: Optional[int] = None, cols: Optional[int] = None) -> None:
+        with self.client._call("resize"):
+            if cols:
+                self.col_count = cols
+
+    def update(self, range_name: Any = None, values: Any = None, **kwargs) -> Dict[str, Any]:
+        if isinstance(range_name, list):
+            # old gspread argument order: update(values, range_name)
+            range_name, values = values, range_name
+        with self.client._call("update"):
+            self._write(range_name, values)
+            return {}
+
+    def batch_update(self, data: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        with self.client._call("batch_update"):
+            for d in data:
+                self._write(d["range"], d["values"])
+            return {}
+
+    def _append(self, values: List[List[Any]]) -> Dict[str, Any]:
+        self.data = _trim(self.data)
+        start = len(self.data) + 1
+        self.data.extend([_cell(v) for v in r] for r in values)
+        end = start + len(values) - 1
+        width = max([len(r) for r in values] + [1])
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:{_col_letters(width)}{end}"}}
+
+    def append_rows(self, values: List[List[Any]], **kwargs) -> Dict[str, Any]:
+        with self.client._call("append_rows"):
+            return self._append(values)
+
+    def append_row(self, values: List[Any], **kwargs) -> Dict[str, Any]:
+        with self.client._call("append_row"):
+            return self._append([values])
+
+    def delete_rows(self, start_index: int, end_index: Optional[int] = None) -> None:
+        with self.client._call("delete_rows"):
+            del self.data[start_index - 1:end_index or start_index]
+
+
+class FakeSpreadsheet:
+    def __init__(self, client: "FakeClient", sheets: Dict[str, List[List[Any]]]):
+        self.client = client
+        self.sheets = {title: FakeWorksheet(client, title, rows) for title, rows in sheets.items()}
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        with self.client._call("worksheet"):
+            try:
+                return self.sheets[title]
+            except KeyError:
+                raise gspread.exceptions.WorksheetNotFound(title)
+
+    def values_batch_get(self, ranges: List[str], params: Any = None) -> Dict[str, Any]:
+        with self.client._call("values_batch_get"):
+            out = []
+            for rng in ranges:
+                title = _split_range(rng)[0]
+                values = self.sheets[title]._slice(rng)
+                out.append({"range": rng, "majorDimension": "ROWS", **({"values": values} if values else {})})
+            return {"valueRanges": out}
+
+
+class FakeClient:
+    """Plays gspread.Client: open_by_key() returns the one in-memory spreadsheet."""
+
+    def __init__(self, sheets: Dict[str, List[List[Any]]], latency: Latency = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._lock = threading.Lock()
+        self.spreadsheet = FakeSpreadsheet(self, sheets)
+
+    def _delay(self, name: str) -> float:
+        if isinstance(self.latency, dict):
+            return self.latency.get(name, self.latency.get("default", 0.0))
+        return self.latency
+
+    @contextmanager
+    def _call(self, name: str):
+        # the simulated network time overlaps between threads, the data access doesn't
+        delay = self._delay(name)
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            self.calls[name] += 1
+            yield
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        with self._call("open_by_key"):
+            return self.spreadsheet
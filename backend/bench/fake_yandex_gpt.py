@@ -0,0 +1,147 @@
+# backend/bench/fake_yandex_gpt.py
+"""
+Local stand-in for the YandexGPT completion endpoint.
+
+    server = FakeYandexGPT(recs, chunk=12, delay=0.05).start()
+    yandex_gpt_client.YANDEX_COMPLETION_URL = server.url   # or YC_COMPLETION_URL=...
+    ...
+    server.stop()
+
+or standalone, for the whole app:
+
+    python bench/fake_yandex_gpt.py --port 8081 [--truncated]
+    YC_COMPLETION_URL=http://127.0.0.1:8081/ YC_API_KEY=x YC_FOLDER_ID=x flask run
+
+With "stream": true the answer is the same NDJSON shape the API sends:
+one {"result": ...} object per line, each holding the text generated so
+far, `chunk` characters more every `delay` seconds. Without it the whole
+text comes at once after the same total time.
+
+truncated=True cuts the streamed array off after two items and half of a
+third, the way a model that runs out of tokens does; plain requests (the
+repair pass) still get the full array. Request bodies are kept in
+server.requests.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+SAMPLE_RECS = [
+    {"title": "Пикник на обочине", "author": "Аркадий и Борис Стругацкие", "genre": "фантастика",
+     "why": "Любите \"Трудно быть богом\" — тот же мир [и те же вопросы]."},
+    {"title": "Солярис", "author": "Станислав Лем", "genre": "фантастика",
+     "why": "Медленная философская фантастика, как {вы} любите."},
+    {"title": "Имя розы", "author": "Умберто Эко", "genre": "детектив",
+     "why": "Детектив с историей и спорами о книгах."},
+    {"title": "Шантарам", "author": "Грегори Дэвид Робертс", "genre": "роман",
+     "why": "Большой роман-путешествие."},
+    {"title": "Остров Крым", "author": "Василий Аксёнов", "genre": "альтернативная история",
+     "why": "Альтернативная история с ироничным тоном."},
+]
+
+
+def _result(text: str, final: bool) -> Dict[str, Any]:
+    return {
+        "result": {
+            "alternatives": [{
+                "message": {"role": "assistant", "text": text},
+                "status": "ALTERNATIVE_STATUS_FINAL" if final else "ALTERNATIVE_STATUS_PARTIAL",
+            }],
+            "modelVersion": "fake",
+        }
+    }
+
+
+class FakeYandexGPT:
+    def __init__(
+        self,
+        recs: Optional[List[Dict[str, Any]]] = None,
+        chunk: int = 12,
+        delay: float = 0.05,
+        truncated: bool = False,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.recs = SAMPLE_RECS if recs is None else recs
+        self.chunk = chunk
+        self.delay = delay
+        self.truncated = truncated
+        self.requests: List[Dict[str, Any]] = []
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def text(self, stream: bool) -> str:
+        full = json.dumps(self.recs, ensure_ascii=False, indent=1)
+        if not (stream and self.truncated):
+            return full
+        items = [json.dumps(r, ensure_ascii=False) for r in self.recs]
+        return "[" + ", ".join(items[:2]) + ", " + items[2][:len(items[2]) // 2]
+
+    def start(self) -> "FakeYandexGPT":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-yandex-gpt", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                fake.requests.append(body)
+                stream = bool(body.get("completionOptions", {}).get("stream"))
+                text = fake.text(stream)
+                steps = range(fake.chunk, len(text) + fake.chunk, fake.chunk)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                if not stream:
+                    time.sleep(fake.delay * len(steps))
+                    self.wfile.write(json.dumps(_result(text, True), ensure_ascii=False).encode("utf-8"))
+                    return
+                for n in steps:
+                    time.sleep(fake.delay)
+                    line = json.dumps(_result(text[:n], n >= len(text)), ensure_ascii=False)
+                    self.wfile.write(line.encode("utf-8") + b"\n")
+                    self.wfile.flush()
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--chunk", type=int, default=12, help="characters per streamed line")
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds between streamed lines")
+    parser.add_argument("--truncated", action="store_true", help="cut the streamed array short")
+    args = parser.parse_args()
+
+    server = FakeYandexGPT(chunk=args.chunk, delay=args.delay, truncated=args.truncated, port=args.port).start()
+    print(f"fake YandexGPT on {server.url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# backend/library_store.py
+from __future__ import annotations
+
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+# order of the nine criteria scores inside BookRecord.criteria
+CRITERIA = (
+    "usefulness",
+    "engagement",
+    "clarity",
+    "style",
+    "emotions",
+    "relevance",
+    "depth",
+    "practicality",
+    "originality",
+)
+
+# scores are stored as int16; this value means "not rated"
+_NO_SCORE = -32768
+
+
+def _pack_scores(scores: Iterable[Optional[int]]) -> Union[array, tuple]:
+    """Scores as an int16 array, with _NO_SCORE for "not rated".
+
+    A value that doesn't fit (nonsense typed into the sheet) is still
+    returned as is, like before; such a row keeps a plain tuple instead.
+    """
+    values = tuple(scores)
+    if all(v is None or -32768 < v <= 32767 for v in values):
+        return array("h", [_NO_SCORE if v is None else v for v in values])
+    return values
+
+
+def _unpack_scores(packed: Union[array, tuple]) -> List[Optional[int]]:
+    if isinstance(packed, array):
+        return [None if v == _NO_SCORE else v for v in packed]
+    return list(packed)
+
+
+class BookRecord:
+    """
+    One row of "Все книги" as kept in memory.
+
+    Slotted, with the nine criteria scores packed into a typed array, so a
+    large library costs a fraction of the equivalent nested dicts. Records
+    are never mutated once built (the snapshot is copy-on-write); the API
+    dict is produced by to_dict() at the edge.
+    """
+
+    __slots__ = (
+        "id",
+        "title",
+        "author",
+        "status",
+        "genre",
+        "pages",
+        "current_page",
+        "start_at",
+        "rating",
+        "finished",
+        "year",
+        "image",
+        "comment",
+        "criteria",
+        "recommendation",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        title: str,
+        author: str,
+        status: str,
+        genre: str,
+        pages: int,
+        current_page: int,
+        start_at: Optional[str],
+        rating: Optional[float],
+        finished: str,
+        year: Optional[int],
+        image: str,
+        comment: str,
+        criteria: Iterable[Optional[int]],
+        recommendation: str,
+    ):
+        self.id = id
+        self.title = title
+        self.author = author
+        self.status = status
+        self.genre = genre
+        self.pages = pages
+        self.current_page = current_page
+        self.start_at = start_at
+        self.rating = rating
+        self.finished = finished
+        self.year = year
+        self.image = image
+        self.comment = comment
+        self.criteria = criteria if isinstance(criteria, array) else _pack_scores(criteria)
+        self.recommendation = recommendation
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, BookRecord):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __repr__(self) -> str:
+        return f"BookRecord({self.title!r}, {self.author!r})"
+
+    def with_progress(self, current_page: int, start_at: Optional[str]) -> "BookRecord":
+        """Copy with new reading progress (criteria array is shared, it's never mutated)."""
+        clone = BookRecord.__new__(BookRecord)
+        for name in self.__slots__:
+            setattr(clone, name, getattr(self, name))
+        clone.current_page = current_page
+        clone.start_at = start_at
+        return clone
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "author": self.author,
+            "status": self.status,
+            "genre": self.genre,
+            "pages": self.pages,
+            "currentPage": self.current_page,
+            "startAt": self.start_at,
+            "rating": self.rating,
+            "finished": self.finished,
+            "year": self.year,
+            "image": self.image,
+            "comment": self.comment,
+            "criteria": dict(zip(CRITERIA, _unpack_scores(self.criteria))),
+            "recommendation": self.recommendation,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "BookRecord":
+        """Inverse of to_dict() (used to load a saved snapshot)."""
+        c = d.get("criteria") or {}
+        return cls(
+            id=d["id"],
+            title=d["title"],
+            author=d["author"],
+            status=d["status"],
+            genre=d["genre"],
+            pages=d["pages"],
+            current_page=d["currentPage"],
+            start_at=d["startAt"],
+            rating=d["rating"],
+            finished=d["finished"],
+            year=d["year"],
+            image=d["image"],
+            comment=d["comment"],
+            criteria=[c.get(name) for name in CRITERIA],
+            recommendation=d["recommendation"],
+        )
+
+
+class ProgressRecord:
+    """One row of "Прогресс" (a reading session)."""
+
+    __slots__ = ("book", "start_page", "end_page", "start_at", "end_at")
+
+    def __init__(self, book: str, start_page: int, end_page: int, start_at: str, end_at: str):
+        self.book = book
+        self.start_page = start_page
+        self.end_page = end_page
+        self.start_at = start_at
+        self.end_at = end_at
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ProgressRecord):
+            return NotImplemented
+        return (
+            self.book == other.book
+            and self.start_page == other.start_page
+            and self.end_page == other.end_page
+            and self.start_at == other.start_at
+            and self.end_at == other.end_at
+        )
+
+    def __repr__(self) -> str:
+        return f"ProgressRecord({self.book!r}, {self.start_page}-{self.end_page})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "book": self.book,
+            "startPage": self.start_page,
+            "endPage": self.end_page,
+            "startAt": self.start_at,
+            "endAt": self.end_at,
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ProgressRecord":
+        return cls(
+            book=d["book"],
+            start_page=d["startPage"],
+            end_page=d["endPage"],
+            start_at=d["startAt"],
+            end_at=d["endAt"],
+        )
+
+
+def books_to_json(books: Iterable[BookRecord]) -> List[Dict[str, Any]]:
+    return [b.to_dict() for b in books]
+
+
+def progress_to_json(progress: Iterable[ProgressRecord]) -> List[Dict[str, Any]]:
+    return [p.to_dict() for p in progress]
@@ -0,0 +1,272 @@
+# backend/reading_stats.py
+from __future__ import annotations
+
+import os
+import re
+import threading
+from datetime import datetime, date, timedelta
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from library_store import BookRecord, ProgressRecord
+
+TZ = ZoneInfo(os.getenv("APP_TZ", "Europe/Moscow"))
+
+# distinct timestamp strings remembered by _parse_dt
+PARSE_DT_CACHE_SIZE = int(os.getenv("PARSE_DT_CACHE_SIZE", "65536"))
+
+def _parse_dt_slow(t: str):
+    # ✅ "+0300" -> "+03:00"
+    t = re.sub(r"([+-]\d{2})(\d{2})$", r"\1:\2", t)
+
+    # 1) "YYYY-MM-DD HH:mm"
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(t, fmt)
+        except ValueError:
+            pass
+
+    # 2) "DD.MM.YYYY HH:mm" / "DD.MM.YYYY"
+    for fmt in ("%d.%m.%Y %H:%M", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(t, fmt)
+        except ValueError:
+            pass
+
+    # 3) ISO (или "YYYY-MM-DDTHH:mm:ss", или "YYYY-MM-DD HH:mm:ss")
+    try:
+        iso = t.replace(" ", "T")
+        return datetime.fromisoformat(iso)
+    except Exception:
+        return None
+
+
+_YMD_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{2}):(\d{2}))?", re.ASCII)
+_DMY_RE = re.compile(r"(\d{2})\.(\d{2})\.(\d{4})(?: (\d{2}):(\d{2}))?", re.ASCII)
+_ISO_PREFIX_RE = re.compile(r"\d{4}-\d{2}-\d{2}[ T]", re.ASCII)
+_OFFSET_RE = re.compile(r"([+-]\d{2})(\d{2})$")
+
+
+@lru_cache(maxsize=PARSE_DT_CACHE_SIZE)
+def _parse_dt_cached(t: str):
+    # pick the path from the string's shape instead of trying formats in turn
+    try:
+        m = _YMD_RE.fullmatch(t)
+        if m:
+            y, mo, d, hh, mm = m.groups()
+            return datetime(int(y), int(mo), int(d), int(hh or 0), int(mm or 0))
+        m = _DMY_RE.fullmatch(t)
+        if m:
+            d, mo, y, hh, mm = m.groups()
+            return datetime(int(y), int(mo), int(d), int(hh or 0), int(mm or 0))
+        if _ISO_PREFIX_RE.match(t):
+            return datetime.fromisoformat(_OFFSET_RE.sub(r"\1:\2", t).replace(" ", "T"))
+    except ValueError:
+        pass
+    # unusual shapes (unpadded numbers, bad dates...): the original format chain
+    return _parse_dt_slow(t)
+
+
+def _parse_dt(s: str):
+    if not s:
+        return None
+    t = str(s).strip()
+    if not t:
+        return None
+    return _parse_dt_cached(t)
+
+def _record_day(p: ProgressRecord) -> Optional[date]:
+    dt = _parse_dt(p.end_at) or _parse_dt(p.start_at)
+    return dt.date() if dt else None
+
+
+def _streak_payload(last_day: Optional[date], streak: int, longest: int, today: date):
+    """
+    /api/streak response.
+    last_day: последний день с чтением, streak: длина цепочки, которая на нём заканчивается.
+    """
+    if last_day is None:
+        return {
+            "streak": 0,
+            "icon": "candle",   # candle|fire
+            "today_has_reading": False,
+            "last_day": None,
+            "today": today.isoformat(),
+            "longest": 0,
+        }
+
+    gap = (today - last_day).days
+
+    # 3) пропущен день (последняя запись позавчера или раньше) -> сгорел
+    if gap >= 2:
+        return {
+            "streak": 0,
+            "icon": "candle",
+            "today_has_reading": False,
+            "last_day": last_day.isoformat(),
+            "today": today.isoformat(),
+            "longest": longest,
+        }
+
+    # 1) сегодня есть чтение -> огонёк
+    if gap == 0:
+        return {
+            "streak": streak,
+            "icon": "fire",
+            "today_has_reading": True,
+            "last_day": last_day.isoformat(),
+            "today": today.isoformat(),
+            "longest": longest,
+        }
+
+    # 2) сегодня нет чтения, но вчера было:
+    # показываем свечку и N только если стрик > 1, иначе (по твоему условию) -> 0
+    if gap == 1:
+        return {
+            "streak": streak if streak > 1 else 0,
+            "icon": "candle",
+            "today_has_reading": False,
+            "last_day": last_day.isoformat(),
+            "today": today.isoformat(),
+            "longest": longest,
+        }
+
+
+def _xp_for_pages(pages: int) -> int:
+    # если pages не заполнено — даём "среднюю" награду
+    if not pages or pages <= 0:
+        return 180
+    if pages <= 300:
+        return 100
+    if pages <= 500:
+        return 180
+    if pages <= 800:
+        return 300
+    return 450
+
+def _norm_status(s: str) -> str:
+    v = (s or "").strip().lower()
+    if v in ("прочитано", "completed", "complited"):
+        return "completed"
+    if v in ("читаю", "reading"):
+        return "reading"
+    if v in ("хочу прочитать", "запланировано", "planned"):
+        return "planned"
+    return "planned"
+
+
+_ONE_DAY = timedelta(days=1)
+
+
+class ReadingStats:
+    """
+    Streak and XP kept up to date from the repo's change journal.
+
+    Instead of re-parsing every progress row on each request we keep:
+    - the set of reading days, stored as runs of consecutive days
+      (start -> end and end -> start), so adding a day is O(1)
+    - the longest run and the last reading day
+    - XP per completed book id
+
+    The repo snapshot version says whether anything changed; new progress
+    rows and changed/deleted books come from repo.changes_since(). When the
+    journal can't answer (first call, external edits) everything is rebuilt
+    once. "Today" is only applied when a response is built, so the day
+    rollover in APP_TZ needs no recompute.
+    """
+
+    def __init__(self, repo, tz: ZoneInfo = TZ):
+        self._repo = repo
+        self._tz = tz
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._days: set[date] = set()
+        self._run_end: Dict[date, date] = {}    # run start -> run end
+        self._run_start: Dict[date, date] = {}  # run end -> run start
+        self._longest = 0
+        self._last_day: Optional[date] = None
+        self._book_xp: Dict[str, int] = {}      # book id -> xp for completed books
+        self._xp_books = 0
+
+    def streak(self) -> Dict[str, Any]:
+        with self._lock:
+            self._sync()
+            streak = 0
+            if self._last_day is not None:
+                # the last day always ends its run
+                streak = (self._last_day - self._run_start[self._last_day]).days + 1
+            return _streak_payload(self._last_day, streak, self._longest, self._today())
+
+    def xp(self) -> Dict[str, Any]:
+        with self._lock:
+            self._sync()
+            xp_days = 10 * len(self._days)
+            return {
+                "xp_total": self._xp_books + xp_days,
+                "xp_books": self._xp_books,
+                "xp_days": xp_days,
+                "days_count": len(self._days),
+                "today": self._today().isoformat(),
+            }
+
+    def _today(self) -> date:
+        return datetime.now(self._tz).date()
+
+    def _sync(self) -> None:
+        # caller holds self._lock
+        books, progress, version = self._repo.versioned_snapshot()
+        if version == self._version:
+            return
+        delta = self._repo.changes_since(self._version) if self._version else None
+        if delta is None:
+            self._rebuild(books, progress)
+            self._version = version
+            return
+        self._set_books(delta["books"], delta["deleted"])
+        for p in delta["progress"]:
+            self._add_day(_record_day(p))
+        self._version = delta["version"]
+
+    def _rebuild(self, books: List[BookRecord], progress: List[ProgressRecord]) -> None:
+        self._reset()
+        self._set_books(books, ())
+        for p in progress:
+            self._add_day(_record_day(p))
+
+    def _set_books(self, books: List[BookRecord], deleted) -> None:
+        for book_id in deleted:
+            self._xp_books -= self._book_xp.pop(book_id, 0)
+        # several rows may share an id (same title/author): sum them
+        fresh: Dict[str, int] = {}
+        for b in books:
+            xp = 0
+            if _norm_status(b.status) == "completed":
+                xp = _xp_for_pages(b.pages or 0)
+            fresh[b.id] = fresh.get(b.id, 0) + xp
+        for book_id, xp in fresh.items():
+            self._xp_books += xp - self._book_xp.get(book_id, 0)
+            if xp:
+                self._book_xp[book_id] = xp
+            else:
+                self._book_xp.pop(book_id, None)
+
+    def _add_day(self, d: Optional[date]) -> None:
+        if d is None or d in self._days:
+            return
+        self._days.add(d)
+
+        start = end = d
+        if d - _ONE_DAY in self._days:
+            start = self._run_start.pop(d - _ONE_DAY)
+        if d + _ONE_DAY in self._days:
+            end = self._run_end.pop(d + _ONE_DAY)
+        self._run_end[start] = end
+        self._run_start[end] = start
+
+        self._longest = max(self._longest, (end - start).days + 1)
+        if self._last_day is None or d > self._last_day:
+            self._last_day = d
@@ -0,0 +1,104 @@
+# backend/rec_cache.py
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+
+class RecCache:
+    """
+    AI recommendation batches keyed by profile fingerprint.
+
+    - an entry holds the batch last shown for that profile ("recs",
+      "created_at") and possibly a pre-generated one not shown yet ("next")
+    - entries expire `ttl` seconds after they were stored; beyond
+      `max_entries` the least recently used one is dropped
+    - timestamps are wall-clock, so entries saved with the repo snapshot
+      keep their age across restarts; `on_change` is called after every
+      change so the owner can schedule that save
+    """
+
+    def __init__(self, ttl: float, max_entries: int, on_change: Optional[Callable[[], None]] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._on_change = on_change
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def _live(self, key: str) -> Optional[Dict[str, Any]]:
+        # caller holds self._lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["ts"] >= self.ttl:
+            del self._entries[key]
+            return None
+        return entry
+
+    def _changed(self) -> None:
+        if self._on_change is not None:
+            self._on_change()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """{"recs", "created_at"} last shown for this profile, or None."""
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return {"recs": entry["recs"], "created_at": entry["created_at"]}
+
+    def put(self, key: str, recs: List[Dict[str, Any]], created_at: str) -> None:
+        with self._lock:
+            self._entries[key] = {"recs": recs, "created_at": created_at, "ts": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._changed()
+
+    def put_next(self, key: str, recs: List[Dict[str, Any]]) -> bool:
+        """Attach a pre-generated batch to the entry for `key` (if it still exists)."""
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return False
+            self._entries[key] = {**entry, "next": recs}
+        self._changed()
+        return True
+
+    def take_next(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Remove and return the pre-generated batch for `key`, if any."""
+        with self._lock:
+            entry = self._live(key)
+            if entry is None or "next" not in entry:
+                return None
+            entry = dict(entry)
+            recs = entry.pop("next")
+            self._entries[key] = entry
+        self._changed()
+        return recs
+
+    def dump(self) -> List[List[Any]]:
+        """[[key, entry], ...] from least to most recently used, for saving."""
+        with self._lock:
+            now = time.time()
+            return [[k, e] for k, e in self._entries.items() if now - e["ts"] < self.ttl]
+
+    def load(self, items: Any) -> None:
+        """Restore what dump() returned; malformed or expired entries are skipped."""
+        now = time.time()
+        entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        for item in items or []:
+            try:
+                key, entry = item
+                if not isinstance(entry["recs"], list) or now - float(entry["ts"]) >= self.ttl:
+                    continue
+                entries[str(key)] = {**entry, "created_at": str(entry["created_at"]), "ts": float(entry["ts"])}
+            except (KeyError, TypeError, ValueError):
+                continue
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        with self._lock:
+            self._entries = entries
@@ -0,0 +1,144 @@
+# backend/rec_jobs.py
+from __future__ import annotations
+
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# queued -> running -> done | failed
+FINISHED = ("done", "failed")
+
+# fn(emit): emit(rec) hands over each recommendation as soon as it is ready
+JobFn = Callable[[Callable[[Dict[str, Any]], None]], List[Dict[str, Any]]]
+
+
+class RecJobsBusy(RuntimeError):
+    """Too many recommendation jobs are waiting already."""
+
+
+class RecJob:
+    __slots__ = ("id", "key", "status", "created_at", "finished_at", "items", "recs", "error", "finished_ts")
+
+    def __init__(self, key: str):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = "queued"
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.finished_at: Optional[str] = None
+        self.items: List[Dict[str, Any]] = []  # emitted so far
+        self.recs: Optional[List[Dict[str, Any]]] = None
+        self.error: Optional[str] = None
+        self.finished_ts = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == "done":
+            out["recs"] = self.recs
+        elif self.status == "running" and self.items:
+            out["partial"] = list(self.items)
+        elif self.status == "failed":
+            out["error"] = self.error
+        return out
+
+
+class RecJobs:
+    """
+    Runs recommendation generation in the background.
+
+    - submit() returns at once with a job; a job for the same key that is
+      still queued or running is reused instead of starting another
+    - at most `max_concurrent` jobs run (i.e. LLM calls are in flight) at a
+      time; beyond `max_pending` outstanding jobs submit() raises RecJobsBusy
+    - finished jobs can be fetched for `keep_seconds`, then they are dropped
+    """
+
+    def __init__(self, max_concurrent: int = 2, max_pending: int = 20, keep_seconds: float = 600.0):
+        self.max_pending = max_pending
+        self.keep_seconds = keep_seconds
+
+        self._cond = threading.Condition()
+        self._jobs: "OrderedDict[str, RecJob]" = OrderedDict()
+        self._active: Dict[str, RecJob] = {}  # key -> queued/running job
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="ai-recs")
+
+    def submit(self, key: str, fn: JobFn) -> Tuple[Dict[str, Any], bool]:
+        """(job as dict, True if a new job was started)."""
+        with self._cond:
+            self._prune()
+            job = self._active.get(key)
+            if job is not None:
+                return job.to_dict(), False
+            if len(self._active) >= self.max_pending:
+                raise RecJobsBusy("Too many recommendation requests in progress, try again later")
+            job = RecJob(key)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            snapshot = job.to_dict()
+        self._pool.submit(self._run, job, fn)
+        return snapshot, True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job is not None else None
+
+    def wait(self, job_id: str, status: Optional[str], seen: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """The job once its status differs from `status` or it has more than
+        `seen` recommendations (or as is after `timeout`)."""
+        def changed() -> bool:
+            job = self._jobs.get(job_id)
+            return job is None or job.status != status or len(job.items) > seen
+
+        with self._cond:
+            self._cond.wait_for(changed, timeout=timeout)
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job is not None else None
+
+    def _run(self, job: RecJob, fn: JobFn) -> None:
+        with self._cond:
+            job.status = "running"
+            self._cond.notify_all()
+        try:
+            recs = fn(lambda item: self._emit(job, item))
+        except Exception as e:
+            print("AI RECS JOB FAILED:", repr(e))
+            traceback.print_exc()
+            self._finish(job, "failed", error=str(e))
+        else:
+            self._finish(job, "done", recs=recs)
+
+    def _emit(self, job: RecJob, item: Dict[str, Any]) -> None:
+        with self._cond:
+            job.items.append(item)
+            self._cond.notify_all()
+
+    def _finish(self, job: RecJob, status: str, recs=None, error: Optional[str] = None) -> None:
+        with self._cond:
+            job.status = status
+            job.recs = recs
+            if recs is not None:
+                job.items = list(recs)
+            job.error = error
+            job.finished_at = datetime.now(timezone.utc).isoformat()
+            job.finished_ts = time.monotonic()
+            if self._active.get(job.key) is job:
+                del self._active[job.key]
+            self._cond.notify_all()
+
+    def _prune(self) -> None:
+        # caller holds self._cond; jobs are kept in submit order
+        cutoff = time.monotonic() - self.keep_seconds
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            if job.status in FINISHED and job.finished_ts < cutoff:
+                del self._jobs[job_id]
@@ -0,0 +1,148 @@
+# backend/sheets_quota.py
+from __future__ import annotations
+
+import random
+import threading
+import time
+from http import HTTPStatus
+from typing import Any, Dict
+
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+from requests import Response
+
+
+class QuotaExceeded(Exception):
+    """The Sheets quota is used up; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Google Sheets quota exceeded, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """`per_minute` calls per minute, with bursts of up to `per_minute` calls."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self._tokens = self.capacity
+        self._ts = time.monotonic()
+
+    def _fill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+        self._ts = now
+
+    def available(self, now: float) -> bool:
+        self._fill(now)
+        return self._tokens >= 1
+
+    def reserve(self, now: float) -> float:
+        """Take a token (possibly ahead of time); returns how long to wait for it."""
+        self._fill(now)
+        self._tokens -= 1
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def release(self) -> None:
+        self._tokens += 1
+
+
+class QuotaScheduler:
+    """
+    Paces Sheets API calls against per-minute read and write quotas.
+
+    - acquire() waits for a token; if that would take longer than max_wait
+      it raises QuotaExceeded right away instead
+    - has_budget() lets callers skip optional reads and serve the cache
+    - counters (see stats()) show how often calls were paced, retried or
+      rejected, to size quotas and deployments
+    """
+
+    def __init__(
+        self,
+        read_per_minute: float,
+        write_per_minute: float,
+        max_wait: float = 10.0,
+        retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 32.0,
+    ):
+        self.max_wait = max_wait
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._buckets = {"read": TokenBucket(read_per_minute), "write": TokenBucket(write_per_minute)}
+        self._stats: Dict[str, Dict[str, float]] = {
+            kind: {"calls": 0, "throttled": 0, "throttled_seconds": 0.0, "retried": 0, "rejected": 0}
+            for kind in self._buckets
+        }
+
+    def has_budget(self, kind: str) -> bool:
+        with self._lock:
+            return self._buckets[kind].available(time.monotonic())
+
+    def acquire(self, kind: str) -> None:
+        with self._lock:
+            bucket = self._buckets[kind]
+            stats = self._stats[kind]
+            wait = bucket.reserve(time.monotonic())
+            if wait > self.max_wait:
+                bucket.release()
+                stats["rejected"] += 1
+                raise QuotaExceeded(wait)
+            stats["calls"] += 1
+            if wait > 0:
+                stats["throttled"] += 1
+                stats["throttled_seconds"] += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def retry_delay(self, kind: str, attempt: int) -> float:
+        """Jittered exponential backoff before retry number `attempt` (from 0)."""
+        with self._lock:
+            self._stats[kind]["retried"] += 1
+        return random.uniform(0, min(self.backoff * 2 ** attempt, self.max_backoff))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {kind: dict(s) for kind, s in self._stats.items()}
+
+
+# 429 is never applied by the API, so any call can be retried; after a 5xx
+# the call may have gone through, so only idempotent methods are retried
+_RETRY_ALWAYS = {HTTPStatus.TOO_MANY_REQUESTS}
+_IDEMPOTENT = {"GET", "PUT"}
+
+
+class QuotaHTTPClient(HTTPClient):
+    """gspread HTTP client that goes through a QuotaScheduler.
+
+    GET calls count as reads, everything else as writes. A 429 that
+    outlasts the retries is raised as QuotaExceeded.
+    """
+
+    def __init__(self, auth: Any, session: Any = None, scheduler: QuotaScheduler | None = None):
+        super().__init__(auth, session)
+        self.scheduler = scheduler
+
+    def request(self, method: str, endpoint: str, *args: Any, **kwargs: Any) -> Response:
+        if self.scheduler is None:
+            return super().request(method, endpoint, *args, **kwargs)
+
+        kind = "read" if method.upper() == "GET" else "write"
+        attempt = 0
+        while True:
+            self.scheduler.acquire(kind)
+            try:
+                return super().request(method, endpoint, *args, **kwargs)
+            except APIError as e:
+                code = e.code
+                retryable = code in _RETRY_ALWAYS or (code >= 500 and method.upper() in _IDEMPOTENT)
+                if not retryable or attempt >= self.scheduler.retries:
+                    if code == HTTPStatus.TOO_MANY_REQUESTS:
+                        raise QuotaExceeded(self.scheduler.max_backoff) from e
+                    raise
+                time.sleep(self.scheduler.retry_delay(kind, attempt))
+                attempt += 1
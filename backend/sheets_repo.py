@@ -3,11 +3,28 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any, Dict, List, Tuple, Optional
 import hashlib
+import random
+import uuid
+import threading
+from collections import OrderedDict, deque
+import time
+from contextlib import contextmanager
+from functools import partial, wraps
 
 import gspread
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+
+from library_store import BookRecord, ProgressRecord, books_to_json, progress_to_json
+from rec_cache import RecCache
+from sheets_quota import QuotaHTTPClient, QuotaScheduler
+from single_flight import SingleFlight
+from snapshot_store import SnapshotStore
+from write_queue import WriteQueue
 
 import os
+import re
 import sys
 
 import json
@@ -31,6 +48,34 @@ def get_credentials(scopes=None):
     creds = Credentials.from_service_account_file(creds_path)
     return creds.with_scopes(scopes)
 
+# Keep-alive connections to the Google APIs shared by all request threads
+SHEETS_HTTP_POOL = int(os.getenv("SHEETS_HTTP_POOL", "10"))
+
+
+def authorized_session(creds, pool_size: int = SHEETS_HTTP_POOL) -> AuthorizedSession:
+    """HTTP session for gspread that is safe to share between threads.
+
+    - one urllib3 pool of up to `pool_size` keep-alive connections per host;
+      pool_block makes extra threads wait for a free connection instead of
+      opening (and throwing away) new TLS connections
+    - the access token is refreshed in the background shortly before it
+      expires, so request threads keep using the current one meanwhile
+    """
+    if hasattr(creds, "with_non_blocking_refresh"):
+        creds.with_non_blocking_refresh()
+    session = AuthorizedSession(creds)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+    session.mount("https://", adapter)
+    return session
+
+# Per-minute Sheets API budget of this process (Google's default per-user quota is 60/60)
+SHEETS_READ_QUOTA = float(os.getenv("SHEETS_READ_QUOTA", "60"))
+SHEETS_WRITE_QUOTA = float(os.getenv("SHEETS_WRITE_QUOTA", "60"))
+# a call that would wait longer than this for budget fails with QuotaExceeded (-> 503)
+SHEETS_QUOTA_MAX_WAIT = float(os.getenv("SHEETS_QUOTA_MAX_WAIT", "10"))
+# retries of 429 / 5xx answers, with jittered exponential backoff
+SHEETS_RETRIES = int(os.getenv("SHEETS_RETRIES", "5"))
+
 BOOKS_SHEET_NAME = "Все книги"
 PROGRESS_SHEET_NAME = "Прогресс"
 AI_RECS_SHEET = "AI рекомендации"
@@ -71,6 +116,48 @@ AI_RECS_HEADERS = [
     "result_json",
 ]
 
+# How long spreadsheet/worksheet handles are reused before being looked up again
+HANDLES_TTL = float(os.getenv("SHEETS_HANDLES_TTL", "600"))
+
+# Max age of the title|author -> row number index before it is rebuilt
+ROW_INDEX_TTL = float(os.getenv("SHEETS_ROW_INDEX_TTL", "60"))
+
+_UNSET = object()
+
+# Age after which snapshot() serves the cached data but refreshes it in the background
+SNAPSHOT_TTL = float(os.getenv("SYNC_TTL", "10"))
+
+# Optional background thread that re-reads the sheets shortly before the snapshot goes stale
+SYNC_REFRESH = os.getenv("SYNC_REFRESH", "0") == "1"
+# refresh once the snapshot is this share of snapshot_ttl old (±10% jitter)
+SYNC_REFRESH_AHEAD = float(os.getenv("SYNC_REFRESH_AHEAD", "0.8"))
+# backoff after failed refreshes: 1 s, 2 s, 4 s, ... up to this many seconds
+SYNC_REFRESH_MAX_BACKOFF = float(os.getenv("SYNC_REFRESH_MAX_BACKOFF", "300"))
+
+# How many snapshot changes are remembered for /api/sync?since=<version>
+SYNC_JOURNAL_SIZE = int(os.getenv("SYNC_JOURNAL_SIZE", "500"))
+
+# Optional background write queue (see write_queue.py)
+WRITE_QUEUE = os.getenv("SHEETS_WRITE_QUEUE", "0") == "1"
+WRITE_QUEUE_INTERVAL = float(os.getenv("SHEETS_WRITE_QUEUE_INTERVAL", "2"))
+WRITE_QUEUE_MAX = int(os.getenv("SHEETS_WRITE_QUEUE_MAX", "50"))
+
+# Optional local file with the last good snapshot, served right after a restart
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "")
+SNAPSHOT_SAVE_INTERVAL = float(os.getenv("SNAPSHOT_SAVE_INTERVAL", "5"))
+
+# a full read overlapped by our own write is redone up to this many times in all
+READ_ALL_ATTEMPTS = 3
+
+# Max age of the "already recommended" index before it is checked against the AI sheet
+AI_INDEX_TTL = float(os.getenv("SHEETS_AI_INDEX_TTL", "60"))
+# AI recommendation batches by profile fingerprint, saved with the snapshot
+AI_RECS_CACHE_TTL = float(os.getenv("AI_RECS_CACHE_TTL", "86400"))
+AI_RECS_CACHE_SIZE = int(os.getenv("AI_RECS_CACHE_SIZE", "32"))
+
+# 400 = range can't be parsed (sheet renamed), 404 = sheet/spreadsheet gone
+_STALE_HANDLE_CODES = {400, 404}
+
 def _norm(v: Any) -> str:
     return ("" if v is None else str(v)).strip()
 
@@ -95,6 +182,36 @@ def _to_float(v: Any) -> Optional[float]:
         return None
 
 
+def _index_headers(headers: List[Any]) -> Dict[str, int]:
+    idx: Dict[str, int] = {}
+    for i, h in enumerate(headers):
+        h = _norm(h)
+        if h:
+            idx.setdefault(h, i)
+    return idx
+
+
+def _row_key(title: Any, author: Any) -> str:
+    return f"{_norm(title).lower()}||{_norm(author).lower()}"
+
+
+_UPDATED_RANGE_RE = re.compile(r"[A-Z]+(\d+)(?::[A-Z]+(\d+))?$")
+
+
+def _appended_rows(resp: Any) -> Optional[Tuple[int, int]]:
+    """First and last row numbers written by an append call, if reported."""
+    try:
+        rng = resp["updates"]["updatedRange"]
+    except (KeyError, TypeError):
+        return None
+    m = _UPDATED_RANGE_RE.search(rng or "")
+    if not m:
+        return None
+    first = int(m.group(1))
+    last = int(m.group(2) or first)
+    return first, last
+
+
 def _book_id(title: str, author: str) -> str:
     raw = f"{_norm(title).lower()}|{_norm(author).lower()}".encode("utf-8")
     return hashlib.sha1(raw).hexdigest()
@@ -132,282 +249,1185 @@ def _status_to_sheet_value(s: Any) -> str:
     return "хочу прочитать"
 
 
+def _progress_from_record(r: Dict[str, Any]) -> ProgressRecord:
+    return ProgressRecord(
+        book=_norm(r.get("Книга")),
+        start_page=_to_int(r.get("Страница старта")) or 0,
+        end_page=_to_int(r.get("Страница завершения")) or 0,
+        start_at=_norm(r.get("Дата и время начала чтения")),
+        end_at=_norm(r.get("Дата и время окончания чтения")),
+    )
+
+
+def _add_progress(prog_by_title: Dict[str, Dict[str, Any]], p: ProgressRecord) -> Optional[str]:
+    """Fold one progress row into the per-title aggregate; returns the title it touched."""
+    t = p.book
+    if not t:
+        return None
+    agg = prog_by_title.setdefault(t, {"currentPage": 0, "startAt": None})
+    agg["currentPage"] = max(agg["currentPage"], p.end_page)
+    sa = p.start_at
+    if sa:
+        if agg["startAt"] is None or sa < agg["startAt"]:
+            agg["startAt"] = sa
+    return t
+
+
+def _aggregate_progress(progress: List[ProgressRecord]) -> Dict[str, Dict[str, Any]]:
+    # aggregate progress by title
+    prog_by_title: Dict[str, Dict[str, Any]] = {}
+    for p in progress:
+        _add_progress(prog_by_title, p)
+    return prog_by_title
+
+
+def _book_from_record(r: Dict[str, Any], prog_by_title: Dict[str, Dict[str, Any]]) -> BookRecord:
+    title = _norm(r.get("Название"))
+    author = _norm(r.get("Автор"))
+    status = _map_status(r.get("Статус"))
+    genre = _norm(r.get("Жанр"))
+    pages = _to_int(r.get("Количество страниц")) or 0
+    rating = _to_float(r.get("Рейтинг"))
+    finished = _norm(r.get("Закончено"))
+    year = _to_int(r.get("Год"))
+    image = _norm(r.get("Image"))
+    comment = _norm(r.get("Комментарии"))  # not in expected, but keep if exists
+    recommendation = _norm(r.get("Рекомендация"))
+
+    # same order as library_store.CRITERIA
+    criteria = (
+        _to_int(r.get("Полезность")),
+        _to_int(r.get("Увлекательность")),
+        _to_int(r.get("Понятность")),
+        _to_int(r.get("Стиль и язык")),
+        _to_int(r.get("Эмоции")),
+        _to_int(r.get("Актуальность")),
+        _to_int(r.get("Глубина")),
+        _to_int(r.get("Практичность")),
+        _to_int(r.get("Оригинальность")),
+    )
+
+    prog = prog_by_title.get(title, {"currentPage": 0, "startAt": None})
+
+    return BookRecord(
+        id=_book_id(title, author),
+        title=title,
+        author=author,
+        status=status,
+        genre=genre,
+        pages=pages,
+        current_page=prog["currentPage"],
+        start_at=prog["startAt"],
+        rating=rating,
+        finished=finished,
+        year=year,
+        image=image,
+        comment=comment,
+        criteria=criteria,
+        recommendation=recommendation,
+    )
+
+
+def _book_row(book: Dict[str, Any]) -> List[Any]:
+    """Sheet row (columns A..S) for a book coming from the API."""
+    title = _norm(book.get("title"))
+    author = _norm(book.get("author"))
+    incoming_status = book.get("status", None)
+    status_cell: Optional[str] = None
+    if incoming_status is not None and str(incoming_status).strip() != "":
+        status_cell = _status_to_sheet_value(incoming_status)
+    genre = _norm(book.get("genre"))
+    pages = book.get("pages")
+    pages = int(pages) if pages not in (None, "") else ""
+    rating = book.get("rating")
+    rating = float(rating) if rating not in (None, "") else ""
+    finished = _norm(book.get("finished"))
+    year = book.get("year")
+    year = int(year) if year not in (None, "") else ""
+    image = _norm(book.get("image"))
+    recommendation = _norm(book.get("recommendation"))
+    c = book.get("criteria") or {}
+
+    if status_cell is None:
+        status_cell = "хочу прочитать"
+
+    return [
+        title,
+        author,
+        status_cell,
+        genre,
+        pages,
+        rating,
+        finished,
+        year,
+        image,
+        c.get("usefulness") or "",
+        c.get("engagement") or "",
+        c.get("clarity") or "",
+        c.get("style") or "",
+        c.get("emotions") or "",
+        c.get("relevance") or "",
+        c.get("depth") or "",
+        c.get("practicality") or "",
+        c.get("originality") or "",
+        recommendation,
+    ]
+
+
+def _progress_row(item: Dict[str, Any]) -> List[Any]:
+    return [
+        _norm(item.get("book")),
+        int(item.get("startPage", 0) or 0),
+        int(item.get("endPage", 0) or 0),
+        _norm(item.get("startAt")),
+        _norm(item.get("endAt")),
+    ]
+
+
+def _ai_record(row: List[Any]) -> Dict[str, Any]:
+    """{"created_at", "recs"} from an "AI рекомендации" row (broken JSON -> no recs)."""
+    created_at = row[0] if len(row) > 0 else None
+    recs_json = row[1] if len(row) > 1 else "[]"
+    try:
+        recs = json.loads(recs_json) if recs_json else []
+    except Exception:
+        recs = []
+    return {"created_at": created_at, "recs": recs}
+
+
+def _rec_keys(recs: Any) -> Tuple[str, ...]:
+    """Normalized 'title|author' of every recommendation in one batch."""
+    keys = []
+    for r in recs or []:
+        if not isinstance(r, dict):
+            continue
+        title = _norm(r.get("title"))
+        author = _norm(r.get("author"))
+        if title and author:
+            keys.append(f"{title.lower()}|{author.lower()}")
+    return tuple(keys)
+
+
+def _apply_book_rows(
+    books: List[BookRecord],
+    prog_by_title: Dict[str, Dict[str, Any]],
+    items: List[Tuple[str, Optional[List[Any]]]],
+) -> List[BookRecord]:
+    """New books list with written rows applied; a row of None removes that key."""
+    books = list(books)
+    positions: Dict[str, int] = {}
+    for i, b in enumerate(books):
+        positions.setdefault(_row_key(b.title, b.author), i)
+    for key, row in items:
+        pos = positions.get(key)
+        if row is None:
+            if pos is not None:
+                del books[pos]
+                positions = {}
+                for i, b in enumerate(books):
+                    positions.setdefault(_row_key(b.title, b.author), i)
+            continue
+        record = dict(zip(BOOKS_HEADERS, row))
+        if pos is not None:
+            # columns we don't write (e.g. "Комментарии") keep their value
+            record["Комментарии"] = books[pos].comment
+        book = _book_from_record(record, prog_by_title)
+        if pos is None:
+            positions[key] = len(books)
+            books.append(book)
+        else:
+            books[pos] = book
+    return books
+
+
+def _apply_progress_rows(
+    books: List[BookRecord],
+    progress: List[ProgressRecord],
+    prog_by_title: Dict[str, Dict[str, Any]],
+    rows: List[List[Any]],
+) -> Tuple[List[BookRecord], List[ProgressRecord]]:
+    """New (books, progress) with appended progress rows applied.
+
+    prog_by_title is updated in place, one row at a time, so appending a
+    session never re-scans the whole progress log.
+    """
+    if not rows:
+        return books, progress
+    added = [_progress_from_record(dict(zip(PROGRESS_HEADERS, r))) for r in rows]
+    titles = {t for t in (_add_progress(prog_by_title, p) for p in added) if t}
+    if titles:
+        books = [
+            b.with_progress(prog_by_title[b.title]["currentPage"], prog_by_title[b.title]["startAt"])
+            if b.title in titles else b
+            for b in books
+        ]
+    return books, progress + added
+
+
+def _build_row_index(keys) -> Dict[str, List[int]]:
+    """title||author -> sheet row numbers, for keys in sheet order from row 2."""
+    index: Dict[str, List[int]] = {}
+    for row_no, key in enumerate(keys, start=2):
+        index.setdefault(key, []).append(row_no)
+    return index
+
+
+def _diff_books(
+    old: List[BookRecord],
+    new: List[BookRecord],
+) -> Tuple[set, set]:
+    """(changed or added ids, deleted ids) between two books lists.
+
+    Several rows may share an id; the id counts as changed when any of its
+    rows changed, appeared or went away.
+    """
+    old_by_id: Dict[str, List[BookRecord]] = {}
+    for b in old:
+        old_by_id.setdefault(b.id, []).append(b)
+    new_by_id: Dict[str, List[BookRecord]] = {}
+    for b in new:
+        new_by_id.setdefault(b.id, []).append(b)
+    changed = {i for i, rows in new_by_id.items() if old_by_id.get(i) != rows}
+    deleted = set(old_by_id) - set(new_by_id)
+    return changed, deleted
+
+
+def _retry_on_stale_handles(fn):
+    """Retry a repo method once with freshly opened handles.
+
+    Cached worksheet handles go stale when a sheet is renamed or deleted;
+    the API then answers 400/404 before anything is written, so one retry
+    after invalidation is safe for reads and writes alike.
+    """
+    @wraps(fn)
+    def wrapper(self: "SheetsRepo", *args, **kwargs):
+        had_cached = self._handles is not None
+        try:
+            return fn(self, *args, **kwargs)
+        except gspread.exceptions.WorksheetNotFound:
+            self.invalidate()
+            raise
+        except gspread.exceptions.APIError as e:
+            if getattr(e, "code", None) not in _STALE_HANDLE_CODES:
+                raise
+            self.invalidate()
+            if not had_cached:
+                raise
+            return fn(self, *args, **kwargs)
+
+    return wrapper
+
+
 class SheetsRepo:
-    def __init__(self, sheet_id: str):
+    """
+    Google Sheets storage for books, reading progress and AI recommendations.
+
+    One instance is shared by all request threads:
+    - HTTP goes through one pooled keep-alive session (see authorized_session)
+    - cached state (handles, header map, row index, snapshot, journal) is
+      guarded by _lock and swapped, never mutated in place, so readers can
+      use what they got without holding it
+    - book row lookup + write run under _books_write_lock, so a concurrent
+      delete can't shift a row under an update
+    - identical concurrent reads share one request (see SingleFlight)
+    """
+
+    def __init__(
+        self,
+        sheet_id: str,
+        write_queue: Optional[bool] = None,
+        snapshot_ttl: float = SNAPSHOT_TTL,
+        snapshot_path: Optional[str] = None,
+        refresher: Optional[bool] = None,
+        client: Optional[gspread.Client] = None,
+    ):
         self.sheet_id = sheet_id
-        self.creds = get_credentials(SCOPES)
-        self.gc = gspread.authorize(self.creds)
+        self.snapshot_ttl = snapshot_ttl
+        self.quota = QuotaScheduler(
+            SHEETS_READ_QUOTA,
+            SHEETS_WRITE_QUOTA,
+            max_wait=SHEETS_QUOTA_MAX_WAIT,
+            retries=SHEETS_RETRIES,
+        )
+        if client is not None:
+            # a ready client (e.g. bench/fake_gspread.FakeClient): no credentials needed
+            self.creds = None
+            self.gc = client
+        else:
+            self.creds = get_credentials(SCOPES)
+            self.gc = gspread.authorize(
+                self.creds,
+                http_client=partial(QuotaHTTPClient, scheduler=self.quota),
+                session=authorized_session(self.creds),
+            )
+
+        self._lock = threading.Lock()
+        # concurrent identical reads (snapshot, AI sheet, handles) share one request
+        self._flight = SingleFlight()
+        # (spreadsheet, ws_books, ws_progress, ws_ai), opened at _handles_ts
+        self._handles: Optional[Tuple[Any, ...]] = None
+        self._handles_ts = 0.0
+        # worksheet title -> {header: column index}, verified once per handles epoch
+        self._columns: Dict[str, Dict[str, int]] = {}
+        # title||author -> row numbers (ascending, duplicates kept) in the books sheet
+        self._row_index: Optional[Dict[str, List[int]]] = None
+        self._row_index_ts = 0.0
+        # serializes row lookup + write so concurrent deletes can't shift a row under an update
+        self._books_write_lock = threading.Lock()
+        # queued writes patch the snapshot and enter the queue in one step, so
+        # both see them in the same order (the order rows are appended in)
+        self._enqueue_lock = threading.Lock()
+        # bumped when a sheet write starts and ends (see _sheet_write): a full
+        # read that overlapped one must not install its rows or row numbers
+        self._write_gen = 0
+        self._writes_in_flight = 0
+        # last known data with our own writes applied on top (see snapshot())
+        self._books: Optional[List[BookRecord]] = None
+        self._progress: Optional[List[ProgressRecord]] = None
+        self._prog_by_title: Dict[str, Dict[str, Any]] = {}  # currentPage/startAt per title
+        self._snapshot_ts = 0.0  # when the snapshot was last read from the sheet
+        self._version = 0  # bumped on every content change of the snapshot
+        self._instance_id = uuid.uuid4().hex[:12]
+        # (version, changed book ids, deleted book ids, appended progress rows)
+        self._journal: deque = deque(maxlen=SYNC_JOURNAL_SIZE)
+        self._journal_floor = 0  # oldest version a delta can be computed from
+        self._refreshing = False
+        # background refresher (see _refresh_loop); started on the first read
+        self._use_refresher = SYNC_REFRESH if refresher is None else refresher
+        self._refresher: Optional[threading.Thread] = None
+        self._ai_last: Any = _UNSET
+        # "AI рекомендации" index: created_at and rec keys per data row (sheet row = i + 2)
+        self._ai_created: Optional[List[str]] = None
+        self._ai_keys: List[Tuple[str, ...]] = []
+        self._ai_index_ts = 0.0
+        # keys of the last _ai_seen_limit rows, rebuilt lazily after a change
+        self._ai_seen: Optional[frozenset] = None
+        self._ai_seen_limit = 0
+        # True while serving a snapshot loaded from disk that hasn't changed since
+        self._adopted = False
+        self.rec_cache = RecCache(AI_RECS_CACHE_TTL, AI_RECS_CACHE_SIZE, on_change=self._persist)
+
+        path = SNAPSHOT_PATH if snapshot_path is None else snapshot_path
+        self._store: Optional[SnapshotStore] = (
+            SnapshotStore(path, SNAPSHOT_SAVE_INTERVAL) if path else None
+        )
+        if self._store is not None:
+            self._load_saved()
+
+        # book upserts / progress appends are batched when the queue is on;
+        # the snapshot is patched right away, so reads see them immediately
+        use_queue = WRITE_QUEUE if write_queue is None else write_queue
+        self._queue: Optional[WriteQueue] = (
+            WriteQueue(self._flush_writes, WRITE_QUEUE_INTERVAL, WRITE_QUEUE_MAX) if use_queue else None
+        )
 
     def _client(self) -> gspread.Client:
         return self.gc
 
-    def _open(self):
+    def _load_saved(self) -> None:
+        """Start from the snapshot saved by a previous process, if any.
+
+        It is served right away but counts as stale, so the first read starts
+        a background re-read of the sheet (see versioned_snapshot()). The saved
+        version tag is kept, so clients holding it still get 304s as long as
+        the sheet hasn't changed.
+        """
+        state = self._store.load()
+        if state is None or state.get("sheet_id") != self.sheet_id:
+            return
+        try:
+            books = [BookRecord.from_dict(b) for b in state["books"]]
+            progress = [ProgressRecord.from_dict(p) for p in state["progress"]]
+            instance_id, version = str(state["instance_id"]), int(state["version"])
+        except (KeyError, TypeError, ValueError) as e:
+            print("SNAPSHOT LOAD FAILED:", repr(e))
+            return
+        with self._lock:
+            self._books = books
+            self._progress = progress
+            self._prog_by_title = _aggregate_progress(progress)
+            self._instance_id = instance_id
+            self._version = version
+            # no journal survives a restart: deltas only from this version on
+            self._journal_floor = version
+            self._adopted = True
+            if "ai_last" in state:
+                self._ai_last = state["ai_last"]
+            ai_index = state.get("ai_index")
+            if ai_index:
+                # checked against the sheet (column A only) on first use
+                self._ai_created = list(ai_index["created"])
+                self._ai_keys = [tuple(k) for k in ai_index["keys"]]
+        self.rec_cache.load(state.get("rec_cache"))
+
+    def _saved_state(self) -> Optional[Dict[str, Any]]:
+        # called by the store at save time; the lists are copy-on-write, so
+        # serializing them outside the lock is safe
+        with self._lock:
+            books, progress = self._books, self._progress
+            if books is None or progress is None:
+                return None
+            state: Dict[str, Any] = {
+                "sheet_id": self.sheet_id,
+                "instance_id": self._instance_id,
+                "version": self._version,
+            }
+            if self._ai_last is not _UNSET:
+                state["ai_last"] = self._ai_last
+            if self._ai_created is not None:
+                state["ai_index"] = {"created": self._ai_created, "keys": self._ai_keys}
+        state["books"] = books_to_json(books)
+        state["progress"] = progress_to_json(progress)
+        state["rec_cache"] = self.rec_cache.dump()
+        return state
+
+    def _persist(self) -> None:
+        if self._store is not None:
+            self._store.schedule(self._saved_state)
+
+    def invalidate(self) -> None:
+        """Forget cached handles, verified headers and the data snapshot.
+
+        Call this when the spreadsheet was changed outside the app
+        (sheet renamed, columns moved) so everything is looked up again.
+        """
+        with self._lock:
+            self._handles = None
+            self._handles_ts = 0.0
+            self._columns = {}
+            self._row_index = None
+            self._books = None
+            self._progress = None
+            self._prog_by_title = {}
+            self._ai_last = _UNSET
+            self._ai_index_ts = 0.0
+
+    def _open_handles(self) -> Tuple[Any, ...]:
+        with self._lock:
+            handles = self._handles
+            if handles is not None and time.monotonic() - self._handles_ts < HANDLES_TTL:
+                return handles
+        return self._flight.do("handles", self._fetch_handles)
+
+    def _fetch_handles(self) -> Tuple[Any, ...]:
         sh = self.gc.open_by_key(self.sheet_id)
         ws_books = sh.worksheet(BOOKS_SHEET_NAME)
         ws_progress = sh.worksheet(PROGRESS_SHEET_NAME)
         ws_ai = sh.worksheet(AI_RECS_SHEET)
+        handles = (sh, ws_books, ws_progress, ws_ai)
+
+        with self._lock:
+            self._handles = handles
+            self._handles_ts = time.monotonic()
+            self._columns = {}
+            self._row_index = None
+        return handles
+
+    def _open(self):
+        _, ws_books, ws_progress, ws_ai = self._open_handles()
         return ws_books, ws_progress, ws_ai
 
-    def _ensure_headers(self, ws: gspread.Worksheet, expected: List[str]):
+    def _ensure_headers(self, ws: gspread.Worksheet, expected: List[str]) -> Dict[str, int]:
+        """Make sure row 1 holds `expected` and return the header -> column map.
+
+        The check costs one or two API calls, so the result is remembered until
+        the handles are reopened, invalidate() is called or a write fails.
+        """
+        with self._lock:
+            cols = self._columns.get(ws.title)
+        if cols is not None:
+            return cols
+
         # Ensure sheet has enough columns
         if ws.col_count < len(expected):
             ws.resize(cols=len(expected))
 
         current = ws.row_values(1)
         current_norm = [_norm(x) for x in current]
-        if current_norm != expected:
+        if current_norm[:len(expected)] != expected:
             ws.update("A1", [expected])
 
+        # extra columns after the expected ones (e.g. "Комментарии") are kept
+        cols = _index_headers(expected + current_norm[len(expected):])
+        with self._lock:
+            self._columns[ws.title] = cols
+        return cols
+
+    def _grid_records(self, ws: gspread.Worksheet, expected: List[str], values: List[List[Any]]) -> List[Dict[str, Any]]:
+        """Turn a raw value grid (row 1 = headers) into {header: cell} records.
+
+        The header row comes with the data, so verifying it costs nothing
+        unless it is wrong and has to be rewritten.
+        """
+        header = [_norm(x) for x in (values[0] if values else [])]
+        if header[:len(expected)] != expected:
+            with self._lock:
+                self._columns.pop(ws.title, None)
+            self._ensure_headers(ws, expected)
+            header = expected + header[len(expected):]
+
+        cols = _index_headers(header)
+        with self._lock:
+            self._columns[ws.title] = cols
+        return [
+            {h: (row[i] if i < len(row) else "") for h, i in cols.items()}
+            for row in values[1:]
+        ]
+
+    @contextmanager
+    def _writing(self, ws: gspread.Worksheet):
+        # a failed write may mean the sheet layout changed under us: re-verify next time
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self._columns.pop(ws.title, None)
+                if ws.title == BOOKS_SHEET_NAME:
+                    self._row_index = None
+                # the write may or may not have landed: re-read soon
+                self._snapshot_ts = 0.0
+            raise
+
+    @contextmanager
+    def _sheet_write(self):
+        """Around a write to the books/progress sheets (or the write queue) and
+        the row index and snapshot patches that go with it.
+
+        A full read that overlaps it may or may not see the write, so neither
+        its rows nor its row numbers can be trusted; _read_all() checks the
+        generation and reads again.
+        """
+        with self._lock:
+            self._writes_in_flight += 1
+            self._write_gen += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._writes_in_flight -= 1
+                self._write_gen += 1
+
     @staticmethod
     def _header_index(ws: gspread.Worksheet) -> Dict[str, int]:
-        headers = ws.row_values(1)
-        idx = {}
-        for i, h in enumerate(headers):
-            h = _norm(h)
-            if h:
-                idx[h] = i
-        return idx
-
-    def read_all(self) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
-        ws_books, ws_progress, _ = self._open()
-        self._ensure_headers(ws_books, BOOKS_HEADERS)
-        self._ensure_headers(ws_progress, PROGRESS_HEADERS)
+        return _index_headers(ws.row_values(1))
+
+    def read_all(self) -> Tuple[List[BookRecord], List[ProgressRecord]]:
+        """Re-read both sheets into the snapshot and return it.
+
+        Callers arriving while a read is already in flight (a cold start under
+        load, the background refresh) wait for it instead of starting another.
+        """
+        return self._flight.do("snapshot", self._read_all)
+
+    @_retry_on_stale_handles
+    def _read_all(self) -> Tuple[List[BookRecord], List[ProgressRecord]]:
+        for attempt in range(READ_ALL_ATTEMPTS):
+            with self._lock:
+                # None: a write is in flight, this read may or may not contain it
+                gen = None if self._writes_in_flight else self._write_gen
+
+            books, progress, prog_by_title, index = self._fetch_all()
+
+            with self._lock:
+                if gen is None or gen != self._write_gen:
+                    # our own write landed while the request was out: the result
+                    # may predate it and would undo its patch of the snapshot
+                    self._row_index = None
+                    if self._books is not None and self._progress is not None:
+                        if attempt + 1 < READ_ALL_ATTEMPTS:
+                            continue
+                        # writes keep overlapping: the patched snapshot stays, re-read later
+                        return self._books, self._progress
+                else:
+                    # records keep sheet order, so the full read refreshes the row index for free
+                    self._row_index = index
+                    self._row_index_ts = time.monotonic()
+
+                old_books, old_progress = self._books, self._progress
+                if books != old_books or progress != old_progress:
+                    self._books = books
+                    self._progress = progress
+                    self._prog_by_title = prog_by_title
+                    if old_books is None or old_progress is None or progress[:len(old_progress)] != old_progress:
+                        # progress rows were edited/removed, not just appended: no delta possible
+                        self._bump_version(reset=True)
+                    else:
+                        changed, deleted = _diff_books(old_books, books)
+                        self._bump_version(changed, deleted, len(progress) - len(old_progress))
+                self._snapshot_ts = time.monotonic()
+                books, progress = self._books, self._progress
+            self._persist()
+            return books, progress
+
+    def _fetch_all(self):
+        """(books, progress, progress aggregate, row index) as the sheets are now,
+        with queued writes laid over them."""
+        sh, ws_books, ws_progress, _ = self._open_handles()
+
+        # both sheets in one request; row 1 doubles as the header check
+        resp = sh.values_batch_get([
+            gspread.utils.absolute_range_name(BOOKS_SHEET_NAME),
+            gspread.utils.absolute_range_name(PROGRESS_SHEET_NAME),
+        ])
+        books_grid, progress_grid = [vr.get("values", []) for vr in resp["valueRanges"]]
+
+        books_rows = self._grid_records(ws_books, BOOKS_HEADERS, books_grid)
+        progress_rows = self._grid_records(ws_progress, PROGRESS_HEADERS, progress_grid)
+        index = _build_row_index(_row_key(r.get("Название"), r.get("Автор")) for r in books_rows)
+
+        # the only full pass over the progress log; writes update the aggregate row by row
+        progress = [_progress_from_record(r) for r in progress_rows]
+        prog_by_title = _aggregate_progress(progress)
+        books = [_book_from_record(r, prog_by_title) for r in books_rows]
+
+        if self._queue is not None:
+            # queued writes haven't reached the sheet yet: lay them over the fresh data
+            pending_books, pending_progress = self._queue.pending()
+            books = _apply_book_rows(books, prog_by_title, pending_books)
+            books, progress = _apply_progress_rows(books, progress, prog_by_title, pending_progress)
+        return books, progress, prog_by_title, index
+
+    def snapshot(self) -> Tuple[List[BookRecord], List[ProgressRecord]]:
+        books, progress, _ = self.versioned_snapshot()
+        return books, progress
 
-        books_rows = ws_books.get_all_records()
-        progress_rows = ws_progress.get_all_records()
-
-        progress: List[Dict[str, Any]] = []
-        for r in progress_rows:
-            progress.append({
-                "book": _norm(r.get("Книга")),
-                "startPage": _to_int(r.get("Страница старта")) or 0,
-                "endPage": _to_int(r.get("Страница завершения")) or 0,
-                "startAt": _norm(r.get("Дата и время начала чтения")),
-                "endAt": _norm(r.get("Дата и время окончания чтения")),
-            })
-
-        # aggregate progress by title
-        prog_by_title: Dict[str, Dict[str, Any]] = {}
-        for p in progress:
-            t = _norm(p.get("book"))
-            if not t:
-                continue
-            agg = prog_by_title.setdefault(t, {"currentPage": 0, "startAt": None})
-            agg["currentPage"] = max(agg["currentPage"], int(p.get("endPage") or 0))
-            sa = _norm(p.get("startAt"))
-            if sa:
-                if agg["startAt"] is None or sa < agg["startAt"]:
-                    agg["startAt"] = sa
-
-        books: List[Dict[str, Any]] = []
-        for r in books_rows:
-            title = _norm(r.get("Название"))
-            author = _norm(r.get("Автор"))
-            status = _map_status(r.get("Статус"))
-            genre = _norm(r.get("Жанр"))
-            pages = _to_int(r.get("Количество страниц")) or 0
-            rating = _to_float(r.get("Рейтинг"))
-            finished = _norm(r.get("Закончено"))
-            year = _to_int(r.get("Год"))
-            image = _norm(r.get("Image"))
-            comment = _norm(r.get("Комментарии"))  # not in expected, but keep if exists
-            recommendation = _norm(r.get("Рекомендация"))
-
-            criteria = {
-                "usefulness": _to_int(r.get("Полезность")),
-                "engagement": _to_int(r.get("Увлекательность")),
-                "clarity": _to_int(r.get("Понятность")),
-                "style": _to_int(r.get("Стиль и язык")),
-                "emotions": _to_int(r.get("Эмоции")),
-                "relevance": _to_int(r.get("Актуальность")),
-                "depth": _to_int(r.get("Глубина")),
-                "practicality": _to_int(r.get("Практичность")),
-                "originality": _to_int(r.get("Оригинальность")),
+    def versioned_snapshot(self) -> Tuple[List[BookRecord], List[ProgressRecord], str]:
+        """Books and progress as of the last read, with our own writes applied.
+
+        This is the shared cache behind every read endpoint:
+        - nothing read yet -> read_all() (the only case that waits for Google)
+        - older than snapshot_ttl -> the cached lists are returned and a
+          background refresh is started (stale-while-revalidate)
+        - with the refresher on, the sheets are re-read ahead of snapshot_ttl
+          by a background thread instead, and requests never trigger reads
+
+        Our own writes patch the snapshot directly, so they never make it
+        stale. The returned lists of BookRecord/ProgressRecord are replaced
+        (never mutated) on writes, so they are safe to serialize while other
+        requests write; turn them into JSON with library_store at the API edge.
+
+        The version string changes whenever the content does (usable as an ETag).
+        """
+        with self._lock:
+            books, progress = self._books, self._progress
+            version = self._version_tag()
+            stale = time.monotonic() - self._snapshot_ts >= self.snapshot_ttl
+            refresh = stale and not self._refreshing and books is not None and not self._use_refresher
+            # out of read budget: keep serving the cached snapshot for now
+            refresh = refresh and self.quota.has_budget("read")
+            if self._use_refresher and books is not None:
+                self._start_refresher()
+            if refresh:
+                self._refreshing = True
+        if books is None or progress is None:
+            self.read_all()
+            with self._lock:
+                return self._books, self._progress, self._version_tag()
+        if refresh:
+            threading.Thread(target=self._refresh_snapshot, name="sheets-snapshot-refresh", daemon=True).start()
+        return books, progress, version
+
+    def _bump_version(self, changed=(), deleted=(), appended: int = 0, reset: bool = False) -> None:
+        # caller holds self._lock
+        if self._adopted:
+            # other processes may have loaded the same saved snapshot: once our
+            # content diverges from it, our tags must not collide with theirs
+            self._adopted = False
+            self._instance_id = uuid.uuid4().hex[:12]
+            reset = True
+        self._version += 1
+        if reset:
+            self._journal.clear()
+            self._journal_floor = self._version
+            return
+        if len(self._journal) == self._journal.maxlen:
+            self._journal_floor = self._journal[0][0]
+        self._journal.append((self._version, set(changed), set(deleted), appended))
+
+    def changes_since(self, since: str) -> Optional[Dict[str, Any]]:
+        """What changed after version `since` (a tag from versioned_snapshot()).
+
+        Returns {"version", "books": changed/added BookRecords, "deleted": book ids,
+        "progress": appended ProgressRecords}, or None when the version is unknown or
+        too old and the client needs the full snapshot.
+        """
+        instance_id, _, num = (since or "").rpartition("-")
+        with self._lock:
+            if self._books is None or self._progress is None:
+                return None
+            if instance_id != self._instance_id or not num.isdigit():
+                return None
+            since_version = int(num)
+            if since_version < self._journal_floor or since_version > self._version:
+                return None
+
+            changed: set = set()
+            deleted: set = set()
+            appended = 0
+            for version, ch, de, ap in self._journal:
+                if version <= since_version:
+                    continue
+                changed = (changed - de) | ch
+                deleted = (deleted - ch) | de
+                appended += ap
+
+            books = [b for b in self._books if b.id in changed]
+            present = {b.id for b in self._books}
+            return {
+                "version": self._version_tag(),
+                "books": books,
+                "deleted": sorted(deleted - present),
+                "progress": self._progress[len(self._progress) - appended:] if appended else [],
             }
 
-            prog = prog_by_title.get(title, {"currentPage": 0, "startAt": None})
-
-            books.append({
-                "id": _book_id(title, author),
-                "title": title,
-                "author": author,
-                "status": status,
-                "genre": genre,
-                "pages": pages,
-                "currentPage": prog["currentPage"],
-                "startAt": prog["startAt"],
-                "rating": rating,
-                "finished": finished,
-                "year": year,
-                "image": image,
-                "comment": comment,
-                "criteria": criteria,
-                "recommendation": recommendation,
-            })
+    def _version_tag(self) -> str:
+        # caller holds self._lock; the instance id keeps tags unique across restarts
+        return f"{self._instance_id}-{self._version}"
 
-        return books, progress
+    def _refresh_snapshot(self) -> None:
+        try:
+            self.read_all()
+        except Exception as e:
+            # keep serving the last good snapshot
+            print("SNAPSHOT REFRESH FAILED:", repr(e))
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _start_refresher(self) -> None:
+        # caller holds self._lock; also restarts the thread in a forked worker
+        if self._refresher is None or not self._refresher.is_alive():
+            self._refresher = threading.Thread(target=self._refresh_loop, name="sheets-refresher", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        """Keep the snapshot fresh so requests are always served from memory.
+
+        Re-reads shortly before snapshot_ttl runs out, with jitter so workers
+        don't hit Google in lockstep. A failed read keeps the last good
+        snapshot and is retried with exponential backoff.
+        """
+        failures = 0
+        while True:
+            if failures:
+                delay = min(2.0 ** (failures - 1), SYNC_REFRESH_MAX_BACKOFF)
+            else:
+                with self._lock:
+                    age = time.monotonic() - self._snapshot_ts
+                delay = self.snapshot_ttl * SYNC_REFRESH_AHEAD - age
+            if delay > 0:
+                time.sleep(delay * random.uniform(0.9, 1.1))
+            try:
+                self.read_all()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                print("SNAPSHOT REFRESH FAILED:", repr(e))
+
+    def _patch_books(self, items: List[Tuple[str, Optional[List[Any]]]]) -> None:
+        """Apply written book rows to the snapshot; a row of None removes that key."""
+        with self._lock:
+            if self._books is None or self._progress is None:
+                return
+            changed = {_book_id(row[0], row[1]) for _, row in items if row is not None}
+            removed = {key for key, row in items if row is None}
+            deleted = {b.id for b in self._books if _row_key(b.title, b.author) in removed}
+            self._books = _apply_book_rows(self._books, self._prog_by_title, items)
+            # one of several rows with the same id went: the rest count as changed,
+            # so delta consumers re-sum what is left under that id
+            present = {b.id for b in self._books}
+            changed |= deleted & present
+            self._bump_version(changed, deleted - changed)
+        self._persist()
+
+    def _patch_progress(self, rows: List[List[Any]]) -> None:
+        """Apply appended progress rows to the snapshot."""
+        with self._lock:
+            if self._books is None or self._progress is None:
+                return
+            self._books, self._progress = _apply_progress_rows(
+                self._books, self._progress, self._prog_by_title, rows
+            )
+            # books of these titles got a new currentPage/startAt
+            titles = {_norm(r[0]) for r in rows}
+            changed = {b.id for b in self._books if b.title in titles}
+            self._bump_version(changed, (), len(rows))
+        self._persist()
+
+    def _set_row_index(self, keys) -> None:
+        index = _build_row_index(keys)
+        with self._lock:
+            self._row_index = index
+            self._row_index_ts = time.monotonic()
+
+    def _key_columns(self, ws: gspread.Worksheet) -> Tuple[str, str, Any]:
+        """(first column letter, last column letter, row -> key) for the
+        narrowest range that holds both title and author."""
+        cols = self._ensure_headers(ws, BOOKS_HEADERS)
+        ti, ai = cols["Название"], cols["Автор"]
+        lo, hi = min(ti, ai), max(ti, ai)
+        first = gspread.utils.rowcol_to_a1(1, lo + 1).rstrip("1")
+        last = gspread.utils.rowcol_to_a1(1, hi + 1).rstrip("1")
+        ti, ai = ti - lo, ai - lo
+
+        def key(row: List[Any]) -> str:
+            return _row_key(row[ti] if len(row) > ti else "", row[ai] if len(row) > ai else "")
+
+        return first, last, key
+
+    def _load_row_index(self, ws: gspread.Worksheet, force: bool = False) -> Dict[str, List[int]]:
+        with self._lock:
+            index = self._row_index
+            if not force and index is not None and time.monotonic() - self._row_index_ts < ROW_INDEX_TTL:
+                return index
+
+        # only the key columns are needed, not the whole sheet
+        first, last, key = self._key_columns(ws)
+        rows = ws.get_values(f"{first}2:{last}")
+        self._set_row_index(key(row) for row in rows)
+        with self._lock:
+            return self._row_index or {}
+
+    def _locate_rows(self, ws: gspread.Worksheet, keys: List[str]) -> Dict[str, int]:
+        """Sheet row of each key that has one, safe to overwrite or delete.
+
+        A cached index only follows our own writes, and the sheet is also
+        edited by hand. So rows taken from it are checked (one batch read of
+        their title/author cells) and on any mismatch the index is rebuilt.
+        """
+        with self._lock:
+            cached = self._row_index is not None and time.monotonic() - self._row_index_ts < ROW_INDEX_TTL
+        index = self._load_row_index(ws)
+        found = {k: index[k][0] for k in keys if index.get(k)}
+        if not cached or not found:
+            return found
+
+        first, last, key = self._key_columns(ws)
+        ranges = [f"{first}{n}:{last}{n}" for n in found.values()]
+        got = ws.batch_get(ranges)
+        if all(key(vr[0] if vr else []) == k for k, vr in zip(found, got)):
+            return found
+
+        index = self._load_row_index(ws, force=True)
+        return {k: index[k][0] for k in keys if index.get(k)}
 
     def _find_row_index(self, ws: gspread.Worksheet, title: str, author: str) -> Optional[int]:
-        # Find by title+author in existing values
-        all_values = ws.get_all_values()
-        rows = all_values[1:]
-        key = f"{_norm(title).lower()}||{_norm(author).lower()}"
-        for i, row in enumerate(rows, start=2):
-            t = _norm(row[0] if len(row) > 0 else "")
-            a = _norm(row[1] if len(row) > 1 else "")
-            if f"{t.lower()}||{a.lower()}" == key:
-                return i
-        return None
-
+        key = _row_key(title, author)
+        return self._locate_rows(ws, [key]).get(key)
+
+    def _index_appended(self, keys: List[str], resp: Any) -> None:
+        span = _appended_rows(resp)
+        with self._lock:
+            if self._row_index is None:
+                return
+            if span is None or span[1] - span[0] + 1 != len(keys):
+                # can't tell where the rows went: rebuild on next lookup
+                self._row_index = None
+                return
+            for row_no, key in enumerate(keys, start=span[0]):
+                self._row_index.setdefault(key, []).append(row_no)
+
+    def _index_deleted(self, row_no: int) -> None:
+        with self._lock:
+            index = self._row_index
+            if index is None:
+                return
+            for key in list(index):
+                rows = [r - 1 if r > row_no else r for r in index[key] if r != row_no]
+                if rows:
+                    index[key] = rows
+                else:
+                    del index[key]
+
+    def _write_book_rows(self, ws: gspread.Worksheet, items: List[Tuple[str, List[Any]]]) -> None:
+        """Write book rows: one batch_update for known rows, one append_rows for new ones."""
+        with self._books_write_lock:
+            found = self._locate_rows(ws, [key for key, _ in items])
+            updates, appends = [], []
+            for key, row in items:
+                row_no = found.get(key)
+                if row_no is not None:
+                    updates.append({"range": f"A{row_no}:S{row_no}", "values": [row]})
+                else:
+                    appends.append((key, row))
+            with self._sheet_write(), self._writing(ws):
+                if updates:
+                    ws.batch_update(updates, value_input_option="USER_ENTERED")
+                if appends:
+                    resp = ws.append_rows([row for _, row in appends], value_input_option="USER_ENTERED")
+                    self._index_appended([key for key, _ in appends], resp)
+
+    @_retry_on_stale_handles
+    def _flush_writes(self, books: List[Tuple[str, List[Any]]], progress: List[List[Any]]) -> None:
+        ws_books, ws_progress, _ = self._open()
+        if books:
+            self._ensure_headers(ws_books, BOOKS_HEADERS)
+            self._write_book_rows(ws_books, books)
+        if progress:
+            self._ensure_headers(ws_progress, PROGRESS_HEADERS)
+            with self._sheet_write(), self._writing(ws_progress):
+                ws_progress.append_rows(progress, value_input_option="USER_ENTERED")
+
+    def flush(self) -> None:
+        """Write out everything waiting in the write queue (no-op without one)."""
+        if self._queue is not None:
+            self._queue.flush()
+
+    @_retry_on_stale_handles
     def upsert_book(self, book: Dict[str, Any]) -> None:
+        key, row = _row_key(book.get("title"), book.get("author")), _book_row(book)
+        if self._queue is not None:
+            # a full read between the patch and the put would see the row in
+            # neither the sheet nor pending(): make it count as overlapping
+            with self._sheet_write(), self._enqueue_lock:
+                self._patch_books([(key, row)])
+                self._queue.put_book(key, row)
+            return
+
         ws_books, _, _ = self._open()
         self._ensure_headers(ws_books, BOOKS_HEADERS)
 
-        title = _norm(book.get("title"))
-        author = _norm(book.get("author"))
-        incoming_status = book.get("status", None)
-        status_cell: Optional[str] = None
-        if incoming_status is not None and str(incoming_status).strip() != "":
-            status_cell = _status_to_sheet_value(incoming_status)
-        genre = _norm(book.get("genre"))
-        pages = book.get("pages")
-        pages = int(pages) if pages not in (None, "") else ""
-        rating = book.get("rating")
-        rating = float(rating) if rating not in (None, "") else ""
-        finished = _norm(book.get("finished"))
-        year = book.get("year")
-        year = int(year) if year not in (None, "") else ""
-        image = _norm(book.get("image"))
-        recommendation = _norm(book.get("recommendation"))
-        c = book.get("criteria") or {}
-
-        if status_cell is None:
-            status_cell = "хочу прочитать"
-
-        row = [
-            title,
-            author,
-            status_cell,
-            genre,
-            pages,
-            rating,
-            finished,
-            year,
-            image,
-            c.get("usefulness") or "",
-            c.get("engagement") or "",
-            c.get("clarity") or "",
-            c.get("style") or "",
-            c.get("emotions") or "",
-            c.get("relevance") or "",
-            c.get("depth") or "",
-            c.get("practicality") or "",
-            c.get("originality") or "",
-            recommendation,
-        ]
-
-        row_index = self._find_row_index(ws_books, title, author)
-        if row_index is None:
-            ws_books.append_row(row, value_input_option="USER_ENTERED")
-        else:
-            # update exact range length
-            ws_books.update(f"A{row_index}:S{row_index}", [row], value_input_option="USER_ENTERED")
-        
-        if status_cell is None:
-            if row_index is not None:
-                existing = ws_books.row_values(row_index)  # 1-indexed
-                # Status is column C (index 2)
-                existing_status = existing[2] if len(existing) > 2 else ""
-                status_cell = _status_to_sheet_value(existing_status)
-            else:
-                status_cell = "хочу прочитать"
-
+        with self._books_write_lock:
+            row_index = self._find_row_index(ws_books, row[0], row[1])
+            with self._sheet_write():
+                with self._writing(ws_books):
+                    if row_index is None:
+                        resp = ws_books.append_row(row, value_input_option="USER_ENTERED")
+                        self._index_appended([key], resp)
+                    else:
+                        # update exact range length
+                        ws_books.update(f"A{row_index}:S{row_index}", [row], value_input_option="USER_ENTERED")
+                self._patch_books([(key, row)])
+
+    @_retry_on_stale_handles
     def delete_book(self, title: str, author: str) -> None:
+        # pending upserts must land first, otherwise the row may not exist yet
+        self.flush()
+
         ws_books, _, _ = self._open()
         self._ensure_headers(ws_books, BOOKS_HEADERS)
-        row_index = self._find_row_index(ws_books, title, author)
-        if row_index is not None:
-            ws_books.delete_rows(row_index)
+        with self._books_write_lock:
+            row_index = self._find_row_index(ws_books, title, author)
+            if row_index is not None:
+                with self._sheet_write():
+                    with self._writing(ws_books):
+                        ws_books.delete_rows(row_index)
+                    self._index_deleted(row_index)
+                    self._patch_books([(_row_key(title, author), None)])
 
+    @_retry_on_stale_handles
     def append_progress(self, item: Dict[str, Any]) -> None:
+        row = _progress_row(item)
+        if self._queue is not None:
+            with self._sheet_write(), self._enqueue_lock:
+                self._patch_progress([row])
+                self._queue.put_progress(row)
+            return
+
         _, ws_progress, _ = self._open()
         self._ensure_headers(ws_progress, PROGRESS_HEADERS)
+        with self._sheet_write():
+            with self._writing(ws_progress):
+                ws_progress.append_row(row, value_input_option="USER_ENTERED")
+            self._patch_progress([row])
+
+    @_retry_on_stale_handles
+    def upsert_books(self, books: List[Dict[str, Any]]) -> None:
+        """Upsert many books in at most two Sheets calls (batch_update + append_rows)."""
+        pending: "OrderedDict[str, List[Any]]" = OrderedDict()
+        for book in books:
+            key = _row_key(book.get("title"), book.get("author"))
+            pending.pop(key, None)  # the same book twice: the last one wins
+            pending[key] = _book_row(book)
+        if not pending:
+            return
+        items = list(pending.items())
+
+        if self._queue is not None:
+            with self._sheet_write(), self._enqueue_lock:
+                self._patch_books(items)
+                for key, row in items:
+                    self._queue.put_book(key, row)
+            return
 
-        row = [
-            _norm(item.get("book")),
-            int(item.get("startPage", 0) or 0),
-            int(item.get("endPage", 0) or 0),
-            _norm(item.get("startAt")),
-            _norm(item.get("endAt")),
-        ]
-        ws_progress.append_row(row, value_input_option="USER_ENTERED")
+        ws_books, _, _ = self._open()
+        self._ensure_headers(ws_books, BOOKS_HEADERS)
+        with self._sheet_write():
+            self._write_book_rows(ws_books, items)
+            self._patch_books(items)
+
+    @_retry_on_stale_handles
+    def append_progress_many(self, items: List[Dict[str, Any]]) -> None:
+        """Append many reading sessions with a single append_rows call."""
+        rows = [_progress_row(item) for item in items]
+        if not rows:
+            return
+
+        if self._queue is not None:
+            with self._sheet_write(), self._enqueue_lock:
+                self._patch_progress(rows)
+                for row in rows:
+                    self._queue.put_progress(row)
+            return
 
-    def append_ai_recs(self, recs: List[Dict[str, Any]]):
+        _, ws_progress, _ = self._open()
+        self._ensure_headers(ws_progress, PROGRESS_HEADERS)
+        with self._sheet_write():
+            with self._writing(ws_progress):
+                ws_progress.append_rows(rows, value_input_option="USER_ENTERED")
+            self._patch_progress(rows)
+
+    @_retry_on_stale_handles
+    def append_ai_recs(self, recs: List[Dict[str, Any]]) -> str:
+        """Append a batch to the AI sheet; returns its created_at."""
         _, _, ws_ai = self._open()
         self._ensure_headers(ws_ai, AI_RECS_HEADERS)
 
         created_at = datetime.now(timezone.utc).isoformat()
         row = [created_at, json.dumps(recs, ensure_ascii=False)]
-        ws_ai.append_row(row, value_input_option="USER_ENTERED")
+        with self._writing(ws_ai):
+            resp = ws_ai.append_row(row, value_input_option="USER_ENTERED")
+        span = _appended_rows(resp)
+        with self._lock:
+            self._ai_last = {"created_at": created_at, "recs": recs}
+            if self._ai_created is not None:
+                if span is not None and span[0] == len(self._ai_created) + 2:
+                    self._ai_created = self._ai_created + [created_at]
+                    self._ai_keys = self._ai_keys + [_rec_keys(recs)]
+                    self._ai_seen = None
+                else:
+                    # rows appeared outside the app: catch up on next use
+                    self._ai_index_ts = 0.0
+        self._persist()
+        return created_at
+
+
+    def read_ai_recs_last(self, use_cache: bool = False):
+        # asked for the cache, or out of read budget: the cached record beats waiting
+        if use_cache or not self.quota.has_budget("read"):
+            with self._lock:
+                if self._ai_last is not _UNSET:
+                    return self._ai_last
+        return self._flight.do("ai_last", self._read_ai_recs_last)
+
+    @_retry_on_stale_handles
+    def _read_ai_recs_last(self):
+        # the index knows the row count (and usually the last record already),
+        # so at most the last row is downloaded
+        self._ensure_ai_index()
+        with self._lock:
+            created = self._ai_created or []
+            if not created:
+                self._ai_last = None
+                return None
+            last = self._ai_last
+            if isinstance(last, dict) and last.get("created_at") == created[-1]:
+                return last
+            row_no = len(created) + 1
 
-
-    def read_ai_recs_last(self):
         _, _, ws_ai = self._open()
+        rows = ws_ai.get_values(f"A{row_no}:B{row_no}")
+        result = _ai_record(rows[0] if rows else [])
+        with self._lock:
+            self._ai_last = result
+        self._persist()
+        return result
 
-        values = ws_ai.get_all_values()
-        if len(values) < 2:
-            return None
-
-        last = values[-1]
-        created_at = last[0] if len(last) > 0 else None
-        recs_json = last[1] if len(last) > 1 else "[]"
 
-        try:
-            recs = json.loads(recs_json) if recs_json else []
-        except Exception:
-            recs = []
-
-        return {"created_at": created_at, "recs": recs}
-
-
-    def read_ai_recs_history(self, limit: int = 200) -> List[Dict[str, Any]]:
+    def read_ai_recs_history(self, limit: int = 200, offset: int = 0) -> List[Dict[str, Any]]:
         """
         Returns list of records (latest first):
         [{"created_at": "...", "recs": [...]}, ...]
-        """
-        _, _, ws_ai = self._open()
-        self._ensure_headers(ws_ai, AI_RECS_HEADERS)
 
-        values = ws_ai.get_all_values()
-        if len(values) < 2:
-            return []
+        `offset` skips that many of the newest records, so the history can be
+        read page by page; only the rows of the page are downloaded.
 
-        # rows: skip header
-        rows = values[1:]
-        if limit and len(rows) > limit:
-            rows = rows[-limit:]
+        Concurrent calls for the same page share one read (and the result
+        list), so treat it as read-only.
+        """
+        return self._flight.do(
+            ("ai_history", limit, offset), lambda: self._read_ai_recs_history(limit, offset)
+        )
+
+    @_retry_on_stale_handles
+    def _read_ai_recs_history(self, limit: int, offset: int) -> List[Dict[str, Any]]:
+        self._ensure_ai_index()
+        with self._lock:
+            total = len(self._ai_created or ())
+        end = max(total - offset, 0)
+        start = max(end - limit, 0) if limit else 0
+        if end <= start:
+            return []
 
-        out: List[Dict[str, Any]] = []
-        for row in rows[::-1]:  # latest first
-            created_at = row[0] if len(row) > 0 else None
-            recs_json = row[1] if len(row) > 1 else "[]"
-            try:
-                recs = json.loads(recs_json) if recs_json else []
-            except Exception:
-                recs = []
-            out.append({"created_at": created_at, "recs": recs})
-        return out
+        _, _, ws_ai = self._open()
+        rows = ws_ai.get_values(f"A{start + 2}:B{end + 1}")
+        rows += [[]] * (end - start - len(rows))  # trailing empty rows aren't returned
+        return [_ai_record(row) for row in reversed(rows)]
+
+    def _ensure_ai_index(self) -> None:
+        with self._lock:
+            if self._ai_created is not None and time.monotonic() - self._ai_index_ts < AI_INDEX_TTL:
+                return
+        self._flight.do("ai_index", self._sync_ai_index)
+
+    @_retry_on_stale_handles
+    def _sync_ai_index(self) -> None:
+        """Bring the AI sheet index up to date, reading as little as possible.
+
+        Column A (timestamps) shows what happened since the last sync: if the
+        rows we know are all still in place, only the rows appended after them
+        are downloaded; otherwise (rows deleted or moved) it is rebuilt.
+        """
+        _, _, ws_ai = self._open()
+        self._ensure_headers(ws_ai, AI_RECS_HEADERS)
+        with self._lock:
+            known, keys = self._ai_created, self._ai_keys
 
-    def get_already_recommended_set(self, limit: int = 200) -> set[str]:
+        created = [_norm(row[0]) if row else "" for row in ws_ai.get_values("A2:A")]
+        if known is not None and created[:len(known)] == known:
+            start = len(known)
+        else:
+            start, keys = 0, []
+        last = _UNSET
+        if len(created) > start:
+            rows = ws_ai.get_values(f"A{start + 2}:B{len(created) + 1}")
+            rows += [[]] * (len(created) - start - len(rows))
+            records = [_ai_record(row) for row in rows]
+            keys = keys + [_rec_keys(r["recs"]) for r in records]
+            last = records[-1]  # the newest record came along for free
+        elif not created:
+            last = None
+
+        changed = start == 0 or len(created) > start
+        with self._lock:
+            if self._ai_created is not known:
+                # append_ai_recs got in between: keep its update, re-check next time
+                self._ai_index_ts = 0.0
+                return
+            self._ai_created = created
+            self._ai_keys = keys
+            self._ai_index_ts = time.monotonic()
+            if last is not _UNSET:
+                self._ai_last = last
+            if changed:
+                self._ai_seen = None
+        if changed:
+            self._persist()
+
+    def get_already_recommended_set(self, limit: int = 200) -> frozenset[str]:
         """
-        Set of normalized 'title|author' that were ever recommended.
+        Set of normalized 'title|author' recommended in the last `limit` batches.
+
+        Served from an index kept next to the snapshot: append_ai_recs adds
+        to it, and the sheet is only consulted (column A, plus any rows added
+        outside the app) once the index is older than SHEETS_AI_INDEX_TTL.
         """
-        history = self.read_ai_recs_history(limit=limit)
-        s: set[str] = set()
-        for h in history:
-            for r in (h.get("recs") or []):
-                title = _norm(r.get("title"))
-                author = _norm(r.get("author"))
-                if title and author:
-                    s.add(f"{title.lower()}|{author.lower()}")
-        return s
\ No newline at end of file
+        self._ensure_ai_index()
+        with self._lock:
+            if self._ai_created is None:
+                return frozenset()
+            if self._ai_seen is None or self._ai_seen_limit != limit:
+                rows = self._ai_keys[-limit:] if limit else self._ai_keys
+                self._ai_seen = frozenset(k for row in rows for k in row)
+                self._ai_seen_limit = limit
+            return self._ai_seen
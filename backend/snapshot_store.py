@@ -0,0 +1,100 @@
+# backend/snapshot_store.py
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import tempfile
+import threading
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+# bump when the saved layout changes; older files are ignored
+FORMAT = 1
+
+# returns the state to save, or None if there is nothing worth saving yet
+StateFn = Callable[[], Optional[Dict[str, Any]]]
+
+
+class SnapshotStore:
+    """
+    Keeps the repo's last good snapshot in a local JSON file.
+
+    - load() returns what was saved last (None if missing/corrupt/other format)
+    - schedule() asks for a save; saves are debounced to one per `interval`
+      seconds and run on a background thread, so writes never wait for disk
+    - the file is replaced atomically (temp file + os.replace), so a crash
+      mid-save leaves the previous snapshot intact
+    - pending saves are written at exit
+    """
+
+    def __init__(self, path: str, interval: float = 5.0):
+        self.path = path
+        self.interval = interval
+
+        self._cond = threading.Condition()
+        self._state_fn: Optional[StateFn] = None
+        self._thread: threading.Thread | None = None
+        self._save_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print("SNAPSHOT LOAD FAILED:", repr(e))
+            return None
+        if not isinstance(state, dict) or state.get("format") != FORMAT:
+            return None
+        return state
+
+    def save(self, state: Dict[str, Any]) -> None:
+        """Write `state` right away (atomically)."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".snapshot-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({**state, "format": FORMAT}, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def schedule(self, state_fn: StateFn) -> None:
+        """Save the state returned by `state_fn` soon (it is called at save time)."""
+        with self._cond:
+            self._state_fn = state_fn
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="snapshot-store", daemon=True)
+                self._thread.start()
+
+    def flush(self) -> None:
+        """Write a pending save now (blocks until done)."""
+        with self._save_lock:
+            with self._cond:
+                state_fn, self._state_fn = self._state_fn, None
+            if state_fn is None:
+                return
+            state = state_fn()
+            if state is not None:
+                self.save(state)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                # let a burst of changes settle into one save
+                self._cond.wait(timeout=self.interval)
+                if self._state_fn is None:
+                    continue
+            try:
+                self.flush()
+            except Exception as e:
+                print("SNAPSHOT SAVE FAILED:", repr(e))
+                traceback.print_exc()
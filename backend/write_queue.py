@@ -0,0 +1,116 @@
+# backend/write_queue.py
+from __future__ import annotations
+
+import atexit
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Any, Callable, List, Tuple
+
+# flush_fn(book_rows, progress_rows); book_rows is [(row_key, row_values), ...]
+FlushFn = Callable[[List[Tuple[str, List[Any]]], List[List[Any]]], None]
+
+
+class WriteQueue:
+    """
+    Collects pending sheet writes and flushes them in batches.
+
+    - book rows are coalesced per row key (the last write wins, in the
+      position of the first one, which is where the snapshot put the book)
+    - progress rows are append-only and kept in order
+    - a background thread flushes every `interval` seconds, or right away
+      once `max_pending` writes are waiting
+    - a failed flush puts its rows back (newer pending writes still win)
+    - rows being written stay in pending() until the write returns, so a
+      read that lays pending() over the sheet never misses them
+    """
+
+    def __init__(self, flush_fn: FlushFn, interval: float = 2.0, max_pending: int = 50):
+        self._flush_fn = flush_fn
+        self.interval = interval
+        self.max_pending = max_pending
+
+        self._cond = threading.Condition()
+        self._books: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self._progress: List[List[Any]] = []
+        # rows taken by the flush that is writing them right now
+        self._inflight_books: List[Tuple[str, List[Any]]] = []
+        self._inflight_progress: List[List[Any]] = []
+        # held while rows taken from the queue are being written
+        self._flush_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        atexit.register(self.flush)
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._books) + len(self._progress)
+
+    def put_book(self, key: str, row: List[Any]) -> None:
+        with self._cond:
+            self._books[key] = row
+            self._wake()
+
+    def put_progress(self, row: List[Any]) -> None:
+        with self._cond:
+            self._progress.append(row)
+            self._wake()
+
+    def pending(self) -> Tuple[List[Tuple[str, List[Any]]], List[List[Any]]]:
+        """Writes not known to be in the sheet yet (book rows, progress rows),
+        including the ones a flush is writing right now."""
+        with self._cond:
+            books: "OrderedDict[str, List[Any]]" = OrderedDict(self._inflight_books)
+            books.update(self._books)
+            return list(books.items()), self._inflight_progress + self._progress
+
+    def flush(self) -> None:
+        """Write everything that is pending now (blocks until done)."""
+        with self._flush_lock:
+            with self._cond:
+                books = list(self._books.items())
+                progress = self._progress
+                self._books = OrderedDict()
+                self._progress = []
+                self._inflight_books, self._inflight_progress = books, progress
+            if not books and not progress:
+                return
+            try:
+                self._flush_fn(books, progress)
+            except Exception:
+                self._requeue(books, progress)
+                raise
+            with self._cond:
+                self._inflight_books, self._inflight_progress = [], []
+
+    def _requeue(self, books: List[Tuple[str, List[Any]]], progress: List[List[Any]]) -> None:
+        with self._cond:
+            # back from in flight to queued in one step, so pending() never has them twice
+            self._inflight_books, self._inflight_progress = [], []
+            merged: "OrderedDict[str, List[Any]]" = OrderedDict(books)
+            merged.update(self._books)
+            self._books = merged
+            self._progress = progress + self._progress
+
+    def _wake(self) -> None:
+        # caller holds self._cond
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="sheets-write-queue", daemon=True)
+            self._thread.start()
+        if len(self._books) + len(self._progress) >= self.max_pending:
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: len(self._books) + len(self._progress) >= self.max_pending,
+                    timeout=self.interval,
+                )
+            try:
+                self.flush()
+            except Exception as e:
+                print("WRITE QUEUE FLUSH FAILED:", repr(e))
+                traceback.print_exc()
+                # back off a little; rows stay queued for the next round
+                with self._cond:
+                    self._cond.wait(timeout=self.interval)
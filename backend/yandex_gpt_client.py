@@ -4,11 +4,14 @@ from __future__ import annotations
 import json
 import os
 import re
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import requests
 
-YANDEX_COMPLETION_URL = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+# можно переопределить, например, на локальный мок-сервер
+YANDEX_COMPLETION_URL = os.getenv(
+    "YC_COMPLETION_URL", "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+)
 
 
 class YandexGPTError(RuntimeError):
@@ -22,6 +25,34 @@ def _env(name: str) -> str:
     return v
 
 
+def _completion_payload(
+    folder_id: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    stream: bool,
+) -> Dict[str, Any]:
+    return {
+        "modelUri": f"gpt://{folder_id}/yandexgpt/latest",
+        "completionOptions": {
+            "stream": stream,
+            "temperature": temperature,
+            "maxTokens": max_tokens,
+        },
+        "messages": messages,
+    }
+
+
+def _result_text(data: Dict[str, Any]) -> str:
+    text = (
+        data.get("result", {})
+        .get("alternatives", [{}])[0]
+        .get("message", {})
+        .get("text", "")
+    )
+    return text if isinstance(text, str) else ""
+
+
 def _post_completion(
     *,
     api_key: str,
@@ -34,15 +65,7 @@ def _post_completion(
     """
     Returns assistant text (string) from YandexGPT.
     """
-    payload = {
-        "modelUri": f"gpt://{folder_id}/yandexgpt/latest",
-        "completionOptions": {
-            "stream": False,
-            "temperature": temperature,
-            "maxTokens": max_tokens,
-        },
-        "messages": messages,
-    }
+    payload = _completion_payload(folder_id, messages, temperature, max_tokens, stream=False)
 
     r = requests.post(
         YANDEX_COMPLETION_URL,
@@ -58,18 +81,124 @@ def _post_completion(
     if r.status_code >= 400:
         raise YandexGPTError(f"YandexGPT HTTP {r.status_code}: {r.text}")
 
-    data = r.json()
-    text = (
-        data.get("result", {})
-        .get("alternatives", [{}])[0]
-        .get("message", {})
-        .get("text", "")
-    )
-    if not isinstance(text, str) or not text.strip():
+    text = _result_text(r.json())
+    if not text.strip():
         raise YandexGPTError("Empty response text from YandexGPT")
     return text.strip()
 
 
+def _stream_completion(
+    *,
+    api_key: str,
+    folder_id: str,
+    messages: List[Dict[str, str]],
+    temperature: float = 0.4,
+    max_tokens: int = 600,
+    timeout: int = 60,
+) -> Iterator[str]:
+    """
+    Streaming variant of _post_completion: yields pieces of the assistant text
+    as they arrive.
+
+    With "stream": true the API answers with one JSON object per line, each
+    holding the text generated so far; only the new tail is yielded.
+    """
+    payload = _completion_payload(folder_id, messages, temperature, max_tokens, stream=True)
+
+    with requests.post(
+        YANDEX_COMPLETION_URL,
+        headers={
+            "Authorization": f"Api-Key {api_key}",
+            "Content-Type": "application/json",
+        },
+        json=payload,
+        timeout=timeout,
+        stream=True,
+    ) as r:
+        if r.status_code >= 400:
+            raise YandexGPTError(f"YandexGPT HTTP {r.status_code}: {r.text}")
+
+        sent = ""
+        for line in r.iter_lines(decode_unicode=True):
+            if not line or not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                raise YandexGPTError(f"Unexpected stream line from YandexGPT: {line[:200]}")
+            if "error" in data:
+                raise YandexGPTError(f"YandexGPT stream error: {data['error']}")
+
+            text = _result_text(data)
+            if text.startswith(sent):
+                piece = text[len(sent):]
+                sent = text
+            else:
+                # not cumulative after all: treat it as a delta
+                piece = text
+                sent += text
+            if piece:
+                yield piece
+
+
+class JsonArrayStream:
+    """
+    Incremental parser for a JSON array of objects arriving in pieces.
+
+    feed() returns the objects completed by the new piece. Anything before
+    the first '[' (prose, code fences) is skipped; parsing stops at the
+    array's closing ']'.
+    """
+
+    def __init__(self):
+        self.text = ""  # everything fed so far
+        self._pos = 0  # next char to scan
+        self._started = False
+        self._finished = False
+        self._depth = 0  # depth inside the array (1 = between items)
+        self._in_string = False
+        self._escape = False
+        self._item_start = -1
+
+    def feed(self, piece: str) -> List[Any]:
+        self.text += piece
+        out: List[Any] = []
+        t = self.text
+        i = self._pos
+        while i < len(t) and not self._finished:
+            ch = t[i]
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 1:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._item_start >= 0:
+                    try:
+                        out.append(json.loads(t[self._item_start:i + 1]))
+                    except ValueError:
+                        pass  # a broken item; the repair pass can still recover it
+                    self._item_start = -1
+                elif self._depth == 0:
+                    self._finished = True
+            i += 1
+        self._pos = i
+        return out
+
+
 def _strip_code_fences(text: str) -> str:
     """
     Removes surrounding ```...``` or ```json...``` fences if present.
@@ -112,6 +241,15 @@ def _parse_recs_json(text: str) -> List[Dict[str, Any]]:
     return data
 
 
+def _normalize_rec(it: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        "title": str(it.get("title", "")).strip(),
+        "author": str(it.get("author", "")).strip(),
+        "genre": str(it.get("genre", "")).strip(),
+        "why": str(it.get("why", "")).strip(),
+    }
+
+
 def _normalize_recs(items: List[Dict[str, Any]]) -> List[Dict[str, str]]:
     """
     Ensures output schema and exactly 5 items.
@@ -123,14 +261,7 @@ def _normalize_recs(items: List[Dict[str, Any]]) -> List[Dict[str, str]]:
     for it in items[:5]:
         if not isinstance(it, dict):
             raise ValueError("Each item must be an object")
-        out.append(
-            {
-                "title": str(it.get("title", "")).strip(),
-                "author": str(it.get("author", "")).strip(),
-                "genre": str(it.get("genre", "")).strip(),
-                "why": str(it.get("why", "")).strip(),
-            }
-        )
+        out.append(_normalize_rec(it))
 
     # базовая валидация полей
     for i, rec in enumerate(out, start=1):
@@ -201,6 +332,90 @@ def generate_book_recommendations(
     api_key = _env("YC_API_KEY")
     folder_id = _env("YC_FOLDER_ID")
 
+    raw = _post_completion(
+        api_key=api_key,
+        folder_id=folder_id,
+        messages=_recs_messages(profile_text),
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=60,
+    )
+
+    try:
+        items = _parse_recs_json(raw)
+        return _normalize_recs(items)
+    except Exception as e:
+        if not use_repair:
+            raise YandexGPTError(f"GPT returned invalid JSON: {e}\nRaw:\n{raw}")
+
+        # repair pass
+        try:
+            return _repair_to_json_array(api_key=api_key, folder_id=folder_id, raw_text=raw)
+        except Exception as e2:
+            raise YandexGPTError(
+                f"GPT returned invalid JSON (and repair failed): {e2}\nRaw:\n{raw}"
+            ) from e2
+
+
+def stream_book_recommendations(
+    *,
+    profile_text: str,
+    temperature: float = 0.4,
+    max_tokens: int = 1200,
+    use_repair: bool = True,
+) -> Iterator[Dict[str, str]]:
+    """
+    Streaming variant of generate_book_recommendations: yields each of the 5
+    recommendations as soon as its JSON object is complete in the stream.
+
+    If the stream ends with fewer than 5 valid items, the repair pass runs
+    on the whole text and the missing ones are yielded from its result.
+    """
+    api_key = _env("YC_API_KEY")
+    folder_id = _env("YC_FOLDER_ID")
+
+    parser = JsonArrayStream()
+    seen = set()
+    for piece in _stream_completion(
+        api_key=api_key,
+        folder_id=folder_id,
+        messages=_recs_messages(profile_text),
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=60,
+    ):
+        for it in parser.feed(piece):
+            if not isinstance(it, dict):
+                continue
+            rec = _normalize_rec(it)
+            key = (rec["title"].lower(), rec["author"].lower())
+            if not rec["title"] or not rec["author"] or not rec["why"] or key in seen:
+                continue
+            seen.add(key)
+            yield rec
+            if len(seen) == 5:
+                return
+
+    raw = parser.text
+    if not use_repair:
+        raise YandexGPTError(f"GPT streamed {len(seen)} of 5 valid items\nRaw:\n{raw}")
+    try:
+        fixed = _repair_to_json_array(api_key=api_key, folder_id=folder_id, raw_text=raw)
+    except Exception as e:
+        raise YandexGPTError(
+            f"GPT streamed {len(seen)} of 5 valid items (and repair failed): {e}\nRaw:\n{raw}"
+        ) from e
+    for rec in fixed:
+        key = (rec["title"].lower(), rec["author"].lower())
+        if key in seen:
+            continue
+        seen.add(key)
+        yield rec
+        if len(seen) == 5:
+            return
+
+
+def _recs_messages(profile_text: str) -> List[Dict[str, str]]:
     system = (
         "Ты книжный рекомендательный ассистент. "
         "Задача: предложить ровно 5 книг, которые понравятся пользователю, "
@@ -236,29 +451,7 @@ def generate_book_recommendations(
         ]
         """.strip()
 
-    raw = _post_completion(
-        api_key=api_key,
-        folder_id=folder_id,
-        messages=[
-            {"role": "system", "text": system},
-            {"role": "user", "text": user},
-        ],
-        temperature=temperature,
-        max_tokens=max_tokens,
-        timeout=60,
-    )
-
-    try:
-        items = _parse_recs_json(raw)
-        return _normalize_recs(items)
-    except Exception as e:
-        if not use_repair:
-            raise YandexGPTError(f"GPT returned invalid JSON: {e}\nRaw:\n{raw}")
-
-        # repair pass
-        try:
-            return _repair_to_json_array(api_key=api_key, folder_id=folder_id, raw_text=raw)
-        except Exception as e2:
-            raise YandexGPTError(
-                f"GPT returned invalid JSON (and repair failed): {e2}\nRaw:\n{raw}"
-            ) from e2
\ No newline at end of file
+    return [
+        {"role": "system", "text": system},
+        {"role": "user", "text": user},
+    ]
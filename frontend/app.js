@@ -1199,15 +1199,28 @@ ensureAuthGate();
     return res.json();
   }
 
-  async function apiAiRecs() {
+  async function apiAiRecs({ force = false } = {}) {
+    // POST только ставит задачу; результат забираем опросом статуса.
+    // Без force для неизменного профиля сервер сразу вернёт прошлую подборку
     const res = await authedFetch(`${API_URL}/api/recs/ai`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({}),
+      body: JSON.stringify({ force }),
     });
     if (!res.ok) throw new Error("Не удалось получить AI рекомендации");
-    return res.json(); // { recs }
-  }  
+    let job = await res.json(); // {id, status, ...}
+
+    const deadline = Date.now() + 3 * 60 * 1000;
+    while (job.status !== "done" && job.status !== "failed") {
+      if (Date.now() > deadline) throw new Error("AI рекомендации готовятся слишком долго");
+      await new Promise(r => setTimeout(r, 1500));
+      const poll = await authedFetch(`${API_URL}/api/recs/ai/jobs/${job.id}`);
+      if (!poll.ok) throw new Error("Не удалось получить AI рекомендации");
+      job = await poll.json();
+    }
+    if (job.status === "failed") throw new Error("Не удалось получить AI рекомендации");
+    return { recs: job.recs || [] };
+  }
 
   async function apiGetAiRecs() {
     const res = await authedFetch(`${API_URL}/api/recs/ai`);
@@ -2185,7 +2198,8 @@ ensureAuthGate();
       render({ main: true, modals: false, chart: false });
 
       try {
-        const data = await apiAiRecs(); // { recs }
+        // кнопка всегда просит новую подборку: прошлая и так уже на экране
+        const data = await apiAiRecs({ force: true }); // { recs }
         state.gpt.list = data.recs || [];
         state.gpt.loading = false;
         render({ main: true, modals: false, chart: false });